@@ -0,0 +1,84 @@
+import time
+from unittest import mock
+
+import pytest
+from flask import Flask
+
+from spp_cognito_auth import Auth, AuthConfig, requires_auth, requires_role
+from spp_cognito_auth.testing import generate_rsa_key, sign_token
+
+pytest.importorskip("pytest_benchmark")
+
+
+@pytest.fixture(scope="session")
+def rsa_keys():
+    return [generate_rsa_key(f"kid-{index}") for index in range(2)]
+
+
+@pytest.fixture
+def config():
+    return AuthConfig(
+        client_id="test-client-id",
+        client_secret="test-client-secret",
+        callback_url="http://test-app-host.test.com/auth/callback",
+        cognito_domain="https://test-cognito-domain.test.com",
+        cognito_endpoint="https://test-cognito-endpoint.test.com",
+    )
+
+
+@pytest.fixture
+def oauth():
+    return mock.MagicMock()
+
+
+@pytest.fixture
+def jwks_mock(config, rsa_keys, requests_mock):
+    return requests_mock.get(
+        "https://test-cognito-endpoint.test.com/.well-known/jwks.json",
+        json={"keys": [public_jwk for _, public_jwk in rsa_keys]},
+        headers={"cache-control": "public, max-age=3600"},
+    )
+
+
+@pytest.fixture
+def auth(config, oauth, jwks_mock):
+    auth = Auth(config, oauth, {})
+    auth.get_public_keys()
+    return auth
+
+
+@pytest.fixture
+def flask_app(auth):
+    app = Flask(__name__)
+    app.secret_key = "my-secret-key"
+    app.auth = auth
+
+    @app.route("/")
+    @requires_auth
+    def root():
+        return "Hello, World!"
+
+    @app.route("/roles")
+    @requires_auth
+    @requires_role(["survey.*.read", "survey.main.write"])
+    def roles():
+        return "Welcome to the Role endpoint!"
+
+    return app
+
+
+@pytest.fixture
+def sign(rsa_keys):
+    def sign(index, **claims):
+        private_key, public_jwk = rsa_keys[index % len(rsa_keys)]
+        claims = {
+            "iss": "https://test-cognito-endpoint.test.com",
+            "client_id": "test-client-id",
+            "token_use": "access",
+            "username": f"user-{index}",
+            "exp": int(time.time()) + 3600,
+            **claims,
+        }
+        return sign_token(private_key, public_jwk["kid"], claims)
+
+    return sign
@@ -0,0 +1,108 @@
+import argparse
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+import requests
+from flask import Flask, session
+from werkzeug.serving import make_server
+
+from spp_cognito_auth import (
+    Auth,
+    AuthBlueprint,
+    new_oauth_client,
+    requires_auth,
+    requires_role,
+)
+from spp_cognito_auth.testing import FakeCognito
+
+
+def sample_app() -> Flask:
+    app = Flask(__name__)
+    app.secret_key = "load-test-secret-key"
+    app.register_blueprint(AuthBlueprint().blueprint())
+
+    @app.route("/")
+    @requires_auth
+    @requires_role(["survey.*.read"])  # type: ignore
+    def root():
+        return "Hello, World!"
+
+    return app
+
+
+def virtual_user(base_url: str, pages: int) -> Dict[str, List[float]]:
+    timings: Dict[str, List[float]] = {"login": [], "page": []}
+    with requests.Session() as http:
+        start = time.perf_counter()
+        response = http.get(base_url + "/")
+        timings["login"].append(time.perf_counter() - start)
+        response.raise_for_status()
+        for _ in range(pages):
+            start = time.perf_counter()
+            response = http.get(base_url + "/", allow_redirects=False)
+            timings["page"].append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise RuntimeError(f"Unexpected status {response.status_code}")
+    return timings
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(name: str, values: List[float], elapsed: float) -> None:
+    print(
+        f"{name:<6} {len(values):>7} requests {len(values) / elapsed:>9.1f} req/s"
+        + f"  p50 {statistics.median(values) * 1000:>7.2f}ms"
+        + f"  p99 {percentile(values, 0.99) * 1000:>7.2f}ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Drive a sample Flask app through the login flow against a "
+        + "local fake Cognito and report throughput and latency."
+    )
+    parser.add_argument("--users", type=int, default=8)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--pages", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+
+    app = sample_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    base_url = f"http://127.0.0.1:{server.server_port}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with FakeCognito(groups=["survey.main.read"], latency=args.latency) as cognito:
+        config = cognito.config(base_url + "/auth/callback")
+        auth = Auth(config, new_oauth_client(config), session)
+        app.auth = auth  # type: ignore
+        auth.warm_up()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.users) as executor:
+            results = list(
+                executor.map(
+                    lambda _: virtual_user(base_url, args.pages), range(args.logins)
+                )
+            )
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+    logins = [value for result in results for value in result["login"]]
+    pages = [value for result in results for value in result["page"]]
+    print(f"{args.users} users, {elapsed:.2f}s, cognito requests: {cognito.requests}")
+    report("login", logins, elapsed)
+    report("page", pages, elapsed)
+    report("total", logins + pages, elapsed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import time
+
+import pytest
+from authlib.oauth2.rfc6749 import OAuth2Token
+
+from spp_cognito_auth import Auth
+
+
+@pytest.fixture
+def logged_in_session(auth, sign):
+    auth._session.update(
+        {
+            "access_token": sign(0),
+            "refresh_token": "refresh-token",
+            "expires_at": time.time() + 3600,
+            "username": "user-0",
+            "roles": ["survey.main.read"],
+        }
+    )
+    return auth._session
+
+
+@pytest.mark.benchmark(group="logged_in")
+def test_logged_in_warm(benchmark, auth, logged_in_session):
+    assert benchmark(auth.logged_in) is True
+
+
+@pytest.mark.benchmark(group="logged_in")
+def test_logged_in_uncached_token(benchmark, auth, logged_in_session):
+    auth._token_cache.maxsize = 0
+    assert benchmark(auth.logged_in) is True
+
+
+@pytest.mark.benchmark(group="logged_in")
+def test_logged_in_cold_jwks(benchmark, config, oauth, jwks_mock, logged_in_session):
+    def setup():
+        return (Auth(config, oauth, dict(logged_in_session)),), {}
+
+    assert (
+        benchmark.pedantic(lambda auth: auth.logged_in(), setup=setup, rounds=50)
+        is True
+    )
+
+
+@pytest.mark.benchmark(group="process_callback")
+def test_process_callback(benchmark, auth, oauth, sign):
+    oauth.fetch_token.return_value = OAuth2Token(
+        {
+            "access_token": sign(0, **{"cognito:groups": ["survey.main.read"]}),
+            "refresh_token": "refresh-token",
+            "expires_in": 3600,
+        }
+    )
+    benchmark(auth.process_callback, "auth-code")
+    assert auth.get_username() == "user-0"
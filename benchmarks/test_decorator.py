@@ -0,0 +1,34 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def client(flask_app, sign):
+    flask_app.auth._session.update(
+        {
+            "access_token": sign(0),
+            "refresh_token": "refresh-token",
+            "expires_at": time.time() + 3600,
+            "username": "user-0",
+            "roles": [f"survey{index}.main.read" for index in range(49)]
+            + ["survey.main.read"],
+        }
+    )
+    return flask_app.test_client()
+
+
+@pytest.mark.benchmark(group="decorators")
+def test_requires_auth(benchmark, client):
+    assert benchmark(client.get, "/").status_code == 200
+
+
+@pytest.mark.benchmark(group="decorators")
+def test_requires_auth_and_role(benchmark, client):
+    assert benchmark(client.get, "/roles").status_code == 200
+
+
+@pytest.mark.benchmark(group="decorators")
+def test_requires_auth_logged_out(benchmark, flask_app):
+    client = flask_app.test_client()
+    assert benchmark(client.get, "/").status_code == 302
@@ -0,0 +1,10 @@
+import subprocess
+import sys
+
+
+def import_package():
+    subprocess.run([sys.executable, "-c", "import spp_cognito_auth"], check=True)
+
+
+def test_import_time(benchmark):
+    benchmark.pedantic(import_package, rounds=10, warmup_rounds=1)
@@ -0,0 +1,52 @@
+import pytest
+
+from spp_cognito_auth.cache import roles_digest
+from spp_cognito_auth.roles import (
+    RoleIndex,
+    compile_matchers,
+    decode_roles,
+    encode_roles,
+)
+
+MATCHERS = {
+    "exact": ["survey.main.write"],
+    "wildcard": ["survey.*.read", "survey.main.write"],
+    "all-wildcards": ["*.*.*"],
+    "miss": ["other.*.read", "*.*.delete"],
+}
+
+
+def roles(count):
+    return [f"survey{index}.main.read" for index in range(count - 1)] + [
+        "survey.other.read"
+    ]
+
+
+@pytest.fixture(params=[1, 50, 500])
+def session_roles(request, auth):
+    auth._session["roles"] = encode_roles(roles(request.param))
+    auth._session["roles_hash"] = roles_digest(roles(request.param))
+    return roles(request.param)
+
+
+@pytest.mark.parametrize("matchers", MATCHERS.values(), ids=MATCHERS.keys())
+@pytest.mark.benchmark(group="has_permission")
+def test_has_permission(benchmark, auth, session_roles, matchers):
+    benchmark(auth.has_permission, compile_matchers(matchers))
+
+
+@pytest.mark.parametrize("matcher", ["survey.main.write", "survey.*.read", "*.*.*"])
+@pytest.mark.benchmark(group="match_role")
+def test_match_role(benchmark, auth, session_roles, matcher):
+    benchmark(auth.match_role, matcher)
+
+
+@pytest.mark.benchmark(group="role_index")
+def test_role_index_build(benchmark, session_roles):
+    benchmark(RoleIndex, session_roles)
+
+
+@pytest.mark.benchmark(group="role_encoding")
+def test_decode_roles(benchmark, session_roles):
+    encoded = encode_roles(session_roles)
+    benchmark(decode_roles.__wrapped__, encoded)
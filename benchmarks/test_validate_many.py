@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture
+def tokens(sign):
+    return [sign(index) for index in range(200)]
+
+
+@pytest.fixture
+def uncached_auth(auth, config):
+    auth._token_cache.maxsize = 0
+    return auth
+
+
+@pytest.mark.benchmark(group="batch-validation")
+def test_decode_token_sequential(benchmark, uncached_auth, tokens):
+    results = benchmark(lambda: [uncached_auth.decode_token(t) for t in tokens])
+    assert len(results) == len(tokens)
+
+
+@pytest.mark.benchmark(group="batch-validation")
+def test_validate_many(benchmark, uncached_auth, tokens):
+    results = benchmark(uncached_auth.validate_many, tokens)
+    assert all(result["username"] for result in results)
+
+
+@pytest.mark.benchmark(group="batch-validation")
+def test_validate_many_duplicates(benchmark, uncached_auth, tokens):
+    results = benchmark(uncached_auth.validate_many, tokens[:20] * 10)
+    assert len(results) == 200
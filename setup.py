@@ -13,16 +13,21 @@ setup(
     description="A python library to add cognito auth to apps",
     url="https://github.com/ONSdigital/spp-cognito-auth",
     license="MIT",
-    packages=["spp_cognito_auth"],
+    packages=["spp_cognito_auth", "spp_cognito_auth.aio"],
     package_dir={"": "."},
     package_data={"spp_cognito_auth": ["py.typed"]},
     python_requires=">=3.6",
     install_requires=[
         "Authlib>=0.15.2",
         "requests>=2.25.0",
+        "urllib3>=1.26",
         "CacheControl>=0.12.6",
         "Flask>=1.1.2",
     ],
+    extras_require={
+        "async": ["httpx>=0.18", "Quart>=0.14"],
+        "prometheus": ["prometheus-client>=0.8"],
+    },
     test_suite="tests",
     classifiers=[
         "Intended Audience :: Developers",
@@ -1,13 +1,71 @@
-from .auth import Auth, new_oauth_client
-from .blueprint import AuthBlueprint
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, List
+
 from .config import AuthConfig
-from .decorator import requires_auth, requires_role
+from .metrics import CallbackMetrics, Metrics, PrometheusMetrics
+from .policy import Policy, all_of, any_of, compile_policy, none_of
+from .principal import Principal
+from .store import FileStore, MemoryStore, RedisStore, Store
+
+if TYPE_CHECKING:
+    from .auth import Auth, new_oauth_client
+    from .blueprint import AuthBlueprint
+    from .decorator import (
+        bearer_principal,
+        current_principal,
+        has_permission,
+        requires_auth,
+        requires_bearer_auth,
+        requires_role,
+    )
+
+LAZY_ATTRIBUTES = {
+    "Auth": ".auth",
+    "new_oauth_client": ".auth",
+    "AuthBlueprint": ".blueprint",
+    "bearer_principal": ".decorator",
+    "current_principal": ".decorator",
+    "has_permission": ".decorator",
+    "requires_auth": ".decorator",
+    "requires_bearer_auth": ".decorator",
+    "requires_role": ".decorator",
+}
 
 __all__ = [
     "Auth",
     "AuthConfig",
     "requires_auth",
     "requires_role",
+    "requires_bearer_auth",
+    "bearer_principal",
     "AuthBlueprint",
     "new_oauth_client",
+    "current_principal",
+    "has_permission",
+    "Principal",
+    "Policy",
+    "all_of",
+    "any_of",
+    "none_of",
+    "compile_policy",
+    "Metrics",
+    "CallbackMetrics",
+    "PrometheusMetrics",
+    "Store",
+    "MemoryStore",
+    "FileStore",
+    "RedisStore",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    module = LAZY_ATTRIBUTES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(module, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(LAZY_ATTRIBUTES))
@@ -0,0 +1,22 @@
+from .auth import AsyncAuth, new_async_oauth_client
+from .blueprint import AsyncAuthBlueprint
+from .decorator import (
+    bearer_principal,
+    current_principal,
+    has_permission,
+    requires_auth,
+    requires_bearer_auth,
+    requires_role,
+)
+
+__all__ = [
+    "AsyncAuth",
+    "AsyncAuthBlueprint",
+    "new_async_oauth_client",
+    "requires_auth",
+    "requires_role",
+    "requires_bearer_auth",
+    "bearer_principal",
+    "current_principal",
+    "has_permission",
+]
@@ -0,0 +1,324 @@
+import asyncio
+import logging
+import time
+from contextvars import ContextVar
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import httpx
+from authlib.integrations.base_client import OAuthError
+from authlib.integrations.httpx_client import AsyncOAuth2Client
+from authlib.jose import JWTClaims
+from authlib.jose.errors import JoseError
+from authlib.oauth2.rfc6749 import OAuth2Token
+
+from ..base import REFRESH_BACKGROUND, REFRESH_BLOCKING, BaseAuth, TokenResult
+from ..cache import token_digest
+from ..config import AuthConfig
+from ..jwks import token_kid
+from ..metrics import Metrics
+from ..principal import Principal
+from ..store import Store
+from ..utils import fix_url
+from .transport import http_timeout, new_async_http_client
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+def new_async_oauth_client(config: AuthConfig) -> AsyncOAuth2Client:
+    return AsyncOAuth2Client(
+        config.client_id,
+        config.client_secret,
+        redirect_uri=fix_url(config.callback_url),
+        timeout=http_timeout(config),
+    )
+
+
+class AsyncAuth(BaseAuth):
+    def __init__(
+        self,
+        config: AuthConfig,
+        oauth: AsyncOAuth2Client,
+        session: Any,
+        store: Optional[Store] = None,
+        cache: Optional[Store] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        super().__init__(config, session, store, cache, metrics)
+        self._oauth = oauth
+        self._http = new_async_http_client(config)
+        self._jwks_lock: Optional[asyncio.Lock] = None
+        self._jwks_refresh_task: Optional[asyncio.Future] = None
+        self._refresh_locks: Dict[str, asyncio.Lock] = {}
+        self._loaded_auth_data: ContextVar[
+            Optional[Tuple[str, Mapping[str, Any]]]
+        ] = ContextVar("spp_cognito_auth_data", default=None)
+
+    async def process_callback(self, auth_code: str) -> None:
+        await self._store_auth_info(
+            await self.get_auth_token(auth_code), new_session=True
+        )
+
+    async def logged_in(self) -> bool:
+        auth_data = await self._load_auth_data()
+        if "access_token" in auth_data:
+            if self._access_token_expiring(auth_data):
+                await self.refresh_access_token()
+                auth_data = self._auth_data()
+            try:
+                await self.decode_token(auth_data["access_token"])
+                return True
+            except (JoseError, ValueError):
+                pass
+        return False
+
+    async def get_auth_token(self, auth_code: str) -> OAuth2Token:
+        return await self._oauth.fetch_token(
+            self.token_url(),
+            grant_type="authorization_code",
+            code=auth_code,
+            authorization_response=self._config.callback_url,
+            **self._code_verifier(),
+        )
+
+    async def refresh_access_token(self) -> bool:
+        refresh_token = (await self._load_auth_data()).get("refresh_token")
+        if not refresh_token:
+            return False
+        auth_info = self._refreshed_tokens.get(refresh_token)
+        if auth_info is None:
+            key = token_digest(refresh_token)
+            lock = self._refresh_locks.setdefault(key, asyncio.Lock())
+            try:
+                async with lock:
+                    auth_info = self._refreshed_tokens.get(refresh_token)
+                    if auth_info is None:
+                        auth_info = await self.get_refreshed_token(refresh_token)
+                        self._refreshed_tokens.set(
+                            refresh_token, auth_info, auth_info["expires_at"]
+                        )
+            except (OAuthError, httpx.HTTPError):
+                logger.warning("Access token refresh failed", exc_info=True)
+                return False
+            finally:
+                self._refresh_locks.pop(key, None)
+        await self._store_auth_info(self._refreshed_auth_info(refresh_token, auth_info))
+        return True
+
+    async def get_refreshed_token(self, refresh_token: str) -> OAuth2Token:
+        return await self._oauth.refresh_token(
+            self.token_url(), refresh_token=refresh_token
+        )
+
+    async def _store_auth_info(
+        self, auth_info: Mapping[str, Any], new_session: bool = False
+    ) -> None:
+        claims = await self.decode_token(auth_info["access_token"])
+        write = self._prepare_auth_data(auth_info, claims, new_session)
+        if write is not None:
+            await self._run_blocking(
+                self._blocking(self._store), self._write_auth_data, write
+            )
+            self._loaded_auth_data.set((write.sid, write.auth_data))
+
+    async def logout(self) -> None:  # type: ignore
+        sid = self._session.get("sid")
+        if self._store is not None and sid is not None:
+            await self._run_blocking(
+                self._blocking(self._store), self._store.delete, sid
+            )
+        self._loaded_auth_data.set(None)
+        self._session.clear()
+
+    def _auth_data(self) -> Mapping[str, Any]:
+        loaded = self._loaded_auth_data.get()
+        if loaded is not None and loaded[0] == self._session.get("sid"):
+            return loaded[1]
+        return super()._auth_data()
+
+    async def _load_auth_data(self) -> Mapping[str, Any]:
+        sid = self._session.get("sid")
+        if self._store is None or sid is None:
+            return super()._auth_data()
+        auth_data = await self._run_blocking(
+            self._blocking(self._store), self._store.get, sid
+        )
+        self._loaded_auth_data.set((sid, auth_data or {}))
+        return auth_data or {}
+
+    async def decode_token(self, access_token: str) -> JWTClaims:
+        shared = self._shares_tokens() and self._blocking(self._cache)
+        claims = await self._run_blocking(
+            shared and access_token not in self._token_cache,
+            self._cached_claims,
+            access_token,
+        )
+        if claims is None:
+            key = await self.get_public_key(token_kid(access_token))
+            claims = await self._run_blocking(
+                shared, self._verify_token, access_token, lambda header, payload: key
+            )
+        return claims
+
+    def _blocking(self, store: Optional[Store]) -> bool:
+        return store is not None and store.blocking
+
+    async def _run_blocking(
+        self, blocking: bool, func: Callable[..., T], *args: Any
+    ) -> T:
+        if not blocking:
+            return func(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def validate_many(
+        self, tokens: Iterable[str], max_workers: Optional[int] = None
+    ) -> List[TokenResult]:
+        tokens = list(tokens)
+        results: Dict[str, TokenResult] = {}
+        pending = await self._run_blocking(
+            self._shares_tokens() and self._blocking(self._cache),
+            self._pending_tokens,
+            tokens,
+            results,
+        )
+        keys: Dict[Optional[str], Any] = {}
+        for kid in pending:
+            try:
+                keys[kid] = await self.get_public_key(kid)
+            except ValueError as error:
+                keys[kid] = error
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._verify_pending_tokens, pending, keys, results, max_workers
+        )
+        return [results[token] for token in tokens]
+
+    async def get_bearer_principal(
+        self, authorization: Optional[str]
+    ) -> Optional[Principal]:
+        access_token = self._bearer_token(authorization)
+        if access_token is None:
+            return None
+        principal = self._bearer_principals.get(access_token)
+        if principal is None:
+            try:
+                claims = await self.decode_token(access_token)
+            except (JoseError, ValueError):
+                return None
+            principal = self._bearer_principal(access_token, claims)
+        return principal
+
+    async def warm_up(self, connect: bool = True) -> Dict[str, Any]:
+        await self.get_public_keys()
+        if connect:
+            await self._open_connection(self._http, self.public_key_url())
+            await self._open_connection(
+                self._oauth, self.token_url(), withhold_token=True
+            )
+        return self.health()
+
+    async def _open_connection(self, client: Any, url: str, **kwargs: Any) -> None:
+        try:
+            await client.request("HEAD", url, **kwargs)
+        except httpx.HTTPError:
+            logger.warning("Could not open connection to %s", url, exc_info=True)
+
+    async def get_public_key(self, kid: Optional[str]) -> Any:
+        await self.get_public_keys()
+        key = self._lookup_public_key(kid)
+        if key is None and self._can_refetch_public_keys():
+            await self.get_public_keys(force=True)
+            key = self._lookup_public_key(kid)
+        if key is None:
+            raise ValueError("Invalid JSON Web Key Set")
+        return key
+
+    async def get_public_keys(self, force: bool = False) -> str:
+        mode = self._public_keys_refresh_mode(force)
+        if mode == REFRESH_BLOCKING:
+            await self._refresh_public_keys(force)
+        elif mode == REFRESH_BACKGROUND:
+            self._refresh_public_keys_in_background()
+        return self._jwks_token  # type: ignore
+
+    async def _refresh_public_keys(self, force: bool = False) -> None:
+        generation = self._jwks_generation
+        lock = self._public_keys_lock()
+        if lock.locked() and not (force or self._jwks_token is None):
+            return
+        try:
+            await asyncio.wait_for(lock.acquire(), self._config.jwks_refresh_timeout)
+        except asyncio.TimeoutError:
+            return
+        try:
+            if self._jwks_generation != generation or (
+                not force and self._public_keys_current()
+            ):
+                return
+            if not force and await self._run_blocking(
+                self._snapshots_blocking(), self._load_public_keys_snapshot
+            ):
+                return
+            await self._fetch_public_keys()
+        finally:
+            lock.release()
+
+    def _refresh_public_keys_in_background(self) -> None:
+        if self._public_keys_lock().locked() or (
+            self._jwks_refresh_task is not None and not self._jwks_refresh_task.done()
+        ):
+            return
+        self._jwks_refresh_task = asyncio.ensure_future(
+            self._background_refresh_public_keys()
+        )
+
+    async def _background_refresh_public_keys(self) -> None:
+        try:
+            await self._refresh_public_keys()
+        except Exception:
+            logger.exception("Background JWKS refresh failed")
+
+    async def _fetch_public_keys(self) -> None:
+        start = time.perf_counter()
+        self._jwks_fetched_at = time.monotonic()
+        try:
+            resp = await self._http.get(self.public_key_url())
+            resp.raise_for_status()
+            jwks = resp.json()
+        except (httpx.HTTPError, ValueError) as error:
+            if not self._serve_stale_public_keys(error):
+                raise
+            return
+        finally:
+            self._jwks_fetch_latency = time.perf_counter() - start
+        await self._run_blocking(
+            self._snapshots_blocking(),
+            self._save_public_keys_snapshot,
+            self._public_keys_fetched(jwks, resp.headers),
+        )
+
+    def _snapshots_blocking(self) -> bool:
+        return self._blocking(self._cache) or self._config.jwks_cache_path is not None
+
+    def _public_keys_lock(self) -> asyncio.Lock:
+        if self._jwks_lock is None:
+            self._jwks_lock = asyncio.Lock()
+        return self._jwks_lock
+
+    async def get_principal(self) -> Optional[Principal]:
+        if not await self.logged_in():
+            return None
+        auth_data = self._auth_data()
+        access_token = auth_data.get("access_token")
+        claims = await self.decode_token(access_token) if access_token else {}
+        return self._principal(auth_data, claims)
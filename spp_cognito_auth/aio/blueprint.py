@@ -0,0 +1,47 @@
+from typing import Callable
+
+from quart import Blueprint, Response, current_app, jsonify, redirect, request
+
+from ..policy import all_of, any_of, none_of
+from .decorator import has_permission
+
+
+class AsyncAuthBlueprint:
+    def __init__(self, default_url: str = "/", url_prefix: str = "/auth") -> None:
+        self.default_url = default_url
+        self.url_prefix = url_prefix
+        self.auth_blueprint = Blueprint(
+            name="auth", import_name=__name__, url_prefix=self.url_prefix
+        )
+
+    def blueprint(self) -> Blueprint:
+        self.add_route("/callback", self.callback)
+        self.add_route("/logout", self.logout)
+        self.add_route("/health", self.health)
+        for template_global in (has_permission, all_of, any_of, none_of):
+            self.auth_blueprint.add_app_template_global(template_global)
+        return self.auth_blueprint
+
+    def add_route(self, route: str, view_func: Callable) -> None:
+        self.auth_blueprint.add_url_rule(route, view_func.__name__, view_func)
+
+    async def callback(self) -> Response:
+        auth_code = request.args.get("code")
+        state = request.args.get("state")
+        if not current_app.auth.validate_state(state):
+            return await self.logout()
+        await current_app.auth.process_callback(auth_code)
+        redirect_url = current_app.auth.get_redirect()
+        if redirect_url:
+            return redirect(redirect_url)
+        return redirect(self.default_url)
+
+    async def logout(self) -> Response:
+        await current_app.auth.logout()
+        return redirect(current_app.auth.logout_url())
+
+    async def health(self) -> Response:
+        health = current_app.auth.health()
+        response = jsonify(health)
+        response.status_code = 200 if health["status"] == "ok" else 503
+        return response
@@ -0,0 +1,106 @@
+from functools import wraps
+
+from quart import Response, abort, current_app, g, redirect, request
+
+from ..decorator import (
+    BEARER_CHALLENGE,
+    BEARER_KEY,
+    INVALID_TOKEN_CHALLENGE,
+    PERMISSIONS_KEY,
+    PRINCIPAL_KEY,
+    SESSION_CHALLENGE,
+    is_navigation,
+)
+from ..policy import compile_policy
+
+
+async def current_principal():
+    if PRINCIPAL_KEY not in g:
+        setattr(g, PRINCIPAL_KEY, await current_app.auth.get_principal())
+    return getattr(g, PRINCIPAL_KEY)
+
+
+async def bearer_principal():
+    if PRINCIPAL_KEY not in g:
+        setattr(g, BEARER_KEY, True)
+        setattr(
+            g,
+            PRINCIPAL_KEY,
+            await current_app.auth.get_bearer_principal(
+                request.headers.get("Authorization")
+            ),
+        )
+    return getattr(g, PRINCIPAL_KEY)
+
+
+def has_permission(role_matchers):
+    policy = compile_policy(role_matchers)
+    permissions = g.setdefault(PERMISSIONS_KEY, {})
+    if policy not in permissions:
+        if g.get(BEARER_KEY):
+            principal = getattr(g, PRINCIPAL_KEY)
+            permitted = (
+                principal is not None
+                and current_app.auth.principal_has_permission(principal, policy)
+            )
+        else:
+            permitted = current_app.auth.has_permission(policy)
+        permissions[policy] = permitted
+    return permissions[policy]
+
+
+def record_denied(status):
+    metrics = current_app.auth.metrics
+    if metrics is not None:
+        metrics.denied(request.endpoint, status)
+
+
+def unauthorized():
+    record_denied(401)
+    if "Authorization" in request.headers:
+        challenge = INVALID_TOKEN_CHALLENGE
+    else:
+        challenge = BEARER_CHALLENGE
+    return Response("", status=401, headers={"WWW-Authenticate": challenge})
+
+
+def requires_auth(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        if await current_principal() is not None:
+            return await f(*args, **kwargs)
+        record_denied(401)
+        if not is_navigation(request.headers):
+            return Response(
+                "", status=401, headers={"WWW-Authenticate": SESSION_CHALLENGE}
+            )
+        current_app.auth.set_redirect(request.url)
+        return redirect(current_app.auth.login_url())
+
+    return decorated
+
+
+def requires_bearer_auth(f):
+    @wraps(f)
+    async def decorated(*args, **kwargs):
+        if await bearer_principal() is not None:
+            return await f(*args, **kwargs)
+        return unauthorized()
+
+    return decorated
+
+
+def requires_role(required_roles):
+    policy = compile_policy(required_roles)
+
+    def decorator(f):
+        @wraps(f)
+        async def decorated(*args, **kwargs):
+            if has_permission(policy):
+                return await f(*args, **kwargs)
+            record_denied(403)
+            abort(403)
+
+        return decorated
+
+    return decorator
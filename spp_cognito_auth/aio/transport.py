@@ -0,0 +1,23 @@
+import httpx
+
+from ..config import AuthConfig
+
+
+def http_timeout(config: AuthConfig) -> httpx.Timeout:
+    return httpx.Timeout(config.http_read_timeout, connect=config.http_connect_timeout)
+
+
+def http_limits(config: AuthConfig) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=config.http_pool_size,
+        max_keepalive_connections=config.http_pool_size,
+    )
+
+
+def new_async_http_client(config: AuthConfig) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=http_timeout(config),
+        transport=httpx.AsyncHTTPTransport(
+            limits=http_limits(config), retries=config.http_retries
+        ),
+    )
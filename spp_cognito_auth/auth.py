@@ -1,139 +1,240 @@
-from datetime import datetime, timedelta
-from typing import Any, List
-from uuid import uuid4
+import logging
+import time
+from threading import Lock, Thread
+from typing import Any, Dict, Iterable, List, Mapping, Optional
 
 import requests
+from authlib.integrations.base_client import OAuthError
 from authlib.integrations.requests_client import OAuth2Session
-from authlib.jose import jwt
-from authlib.jose.errors import ExpiredTokenError
+from authlib.jose import JWTClaims
+from authlib.jose.errors import JoseError
 from authlib.oauth2.rfc6749 import OAuth2Token
-from cachecontrol import CacheController
 
+from .base import REFRESH_BACKGROUND, REFRESH_BLOCKING, BaseAuth, TokenResult
+from .cache import token_digest
 from .config import AuthConfig
+from .metrics import Metrics
+from .principal import Principal
+from .store import Store
+from .transport import http_adapter, mount_http_adapter, new_http_session
 from .utils import fix_url
 
+logger = logging.getLogger(__name__)
+
 
 def new_oauth_client(config: AuthConfig) -> OAuth2Session:
-    return OAuth2Session(
+    oauth = OAuth2Session(
         config.client_id,
         config.client_secret,
         redirect_uri=fix_url(config.callback_url),
     )
-
-
-class Auth:
-    def __init__(self, config: AuthConfig, oauth: OAuth2Session, session: Any) -> None:
-        self._config = config
-        self._session = session
+    mount_http_adapter(oauth, config)
+    return oauth
+
+
+class Auth(BaseAuth):
+    def __init__(
+        self,
+        config: AuthConfig,
+        oauth: OAuth2Session,
+        session: Any,
+        store: Optional[Store] = None,
+        cache: Optional[Store] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        super().__init__(config, session, store, cache, metrics)
         self._oauth = oauth
-        self._jwks_expires_at = None
-        self._jwks_token = None
-
-    def login_url(self) -> str:
-        return self._cognito_url("login")
-
-    def logout_url(self) -> str:
-        return self._cognito_url("logout")
-
-    def public_key_url(self) -> str:
-        return f"{fix_url(self._config.cognito_endpoint)}/.well-known/jwks.json"
-
-    def token_url(self) -> str:
-        return f"{fix_url(self._config.cognito_domain)}/oauth2/token"
+        self._http = new_http_session(config)
+        self._jwks_lock = Lock()
+        self._jwks_refresh_thread: Optional[Thread] = None
+        self._refresh_locks: Dict[str, Lock] = {}
+        self._refresh_locks_lock = Lock()
 
     def process_callback(self, auth_code: str) -> None:
-        auth_info = self.get_auth_token(auth_code)
-        self._session["access_token"] = auth_info["access_token"]
-        self._session["refresh_token"] = auth_info["refresh_token"]
-        self._session["expires_at"] = auth_info["expires_at"]
-
-        token = jwt.decode(self._session["access_token"], self.get_public_keys())
-        self._session["username"] = token["username"]
-        self._session["roles"] = token.get("cognito:groups", [])
+        self._store_auth_info(self.get_auth_token(auth_code), new_session=True)
 
     def logged_in(self) -> bool:
-        if "access_token" in self._session:
+        auth_data = self._auth_data()
+        if "access_token" in auth_data:
+            if self._access_token_expiring(auth_data):
+                self.refresh_access_token()
+                auth_data = self._auth_data()
             try:
-                token = jwt.decode(
-                    self._session["access_token"], self.get_public_keys()
-                )
-                token.validate()
+                self.decode_token(auth_data["access_token"])
                 return True
-            except ExpiredTokenError:
+            except (JoseError, ValueError):
                 pass
         return False
 
-    def logout(self) -> None:
-        self._session.clear()
-
     def get_auth_token(self, auth_code: str) -> OAuth2Token:
         return self._oauth.fetch_token(
             self.token_url(),
             grant_type="authorization_code",
             code=auth_code,
             authorization_response=self._config.callback_url,
+            **self._code_verifier(),
         )
 
-    def get_public_keys(self) -> str:
-        if (
-            self._jwks_token is None
-            or self._jwks_expires_at is None
-            or self._jwks_expires_at <= datetime.now()
-        ):
-            resp = requests.get(self.public_key_url())
-            cache_control = CacheController().parse_cache_control(resp.headers)
-            max_age = cache_control.get("max-age", 0)
-            self._jwks_expires_at = datetime.now() + timedelta(
-                seconds=float(max_age)
-            )  # type: ignore
-            self._jwks_token = resp.json()
+    def refresh_access_token(self) -> bool:
+        refresh_token = self._auth_data().get("refresh_token")
+        if not refresh_token:
+            return False
+        auth_info = self._refreshed_tokens.get(refresh_token)
+        if auth_info is None:
+            key = token_digest(refresh_token)
+            with self._refresh_locks_lock:
+                lock = self._refresh_locks.setdefault(key, Lock())
+            try:
+                with lock:
+                    auth_info = self._refreshed_tokens.get(refresh_token)
+                    if auth_info is None:
+                        auth_info = self.get_refreshed_token(refresh_token)
+                        self._refreshed_tokens.set(
+                            refresh_token, auth_info, auth_info["expires_at"]
+                        )
+            except (OAuthError, requests.RequestException):
+                logger.warning("Access token refresh failed", exc_info=True)
+                return False
+            finally:
+                with self._refresh_locks_lock:
+                    self._refresh_locks.pop(key, None)
+        self._store_auth_info(self._refreshed_auth_info(refresh_token, auth_info))
+        return True
+
+    def get_refreshed_token(self, refresh_token: str) -> OAuth2Token:
+        return self._oauth.refresh_token(self.token_url(), refresh_token=refresh_token)
+
+    def _store_auth_info(
+        self, auth_info: Mapping[str, Any], new_session: bool = False
+    ) -> None:
+        claims = self.decode_token(auth_info["access_token"])
+        self._save_auth_data(auth_info, claims, new_session)
+
+    def decode_token(self, access_token: str) -> JWTClaims:
+        claims = self._cached_claims(access_token)
+        if claims is None:
+            claims = self._verify_token(access_token, self._load_key)
+        return claims
+
+    def validate_many(
+        self, tokens: Iterable[str], max_workers: Optional[int] = None
+    ) -> List[TokenResult]:
+        tokens = list(tokens)
+        results: Dict[str, TokenResult] = {}
+        pending = self._pending_tokens(tokens, results)
+        keys: Dict[Optional[str], Any] = {}
+        for kid in pending:
+            try:
+                keys[kid] = self.get_public_key(kid)  # type: ignore
+            except ValueError as error:
+                keys[kid] = error
+        self._verify_pending_tokens(pending, keys, results, max_workers)
+        return [results[token] for token in tokens]
+
+    def get_bearer_principal(self, authorization: Optional[str]) -> Optional[Principal]:
+        access_token = self._bearer_token(authorization)
+        if access_token is None:
+            return None
+        principal = self._bearer_principals.get(access_token)
+        if principal is None:
+            try:
+                claims = self.decode_token(access_token)
+            except (JoseError, ValueError):
+                return None
+            principal = self._bearer_principal(access_token, claims)
+        return principal
+
+    def transport_stats(self) -> Dict[str, int]:
+        return http_adapter(self._config).stats()
+
+    def warm_up(self, connect: bool = True) -> Dict[str, Any]:
+        self.get_public_keys()
+        if connect:
+            self._open_connection(self.public_key_url())
+            self._open_connection(self.token_url())
+        return self.health()
+
+    def _open_connection(self, url: str) -> None:
+        try:
+            self._http.head(url)
+        except requests.RequestException:
+            logger.warning("Could not open connection to %s", url, exc_info=True)
+
+    def get_public_key(self, kid: str) -> Any:
+        self.get_public_keys()
+        key = self._lookup_public_key(kid)
+        if key is None and self._can_refetch_public_keys():
+            self.get_public_keys(force=True)
+            key = self._lookup_public_key(kid)
+        if key is None:
+            raise ValueError("Invalid JSON Web Key Set")
+        return key
+
+    def get_public_keys(self, force: bool = False) -> str:
+        mode = self._public_keys_refresh_mode(force)
+        if mode == REFRESH_BLOCKING:
+            self._refresh_public_keys(force)
+        elif mode == REFRESH_BACKGROUND:
+            self._refresh_public_keys_in_background()
         return self._jwks_token  # type: ignore
 
-    def get_username(self) -> str:
-        return self._session.get("username")
-
-    def get_roles(self) -> List[str]:
-        return self._session.get("roles", [])
-
-    def match_role(self, role_matcher: str) -> bool:
-        split_role_matcher = role_matcher.split(".")
-        for role in self.get_roles():
-            split_role = role.split(".")
-            role_matched = []
-            for index, role_part in enumerate(split_role_matcher):
-                if role_part == "*":
-                    role_matched.append(True)
-                    continue
-                role_matched.append(role_part == split_role[index])
-            if all(role_matched):
-                return True
-        return False
-
-    def has_permission(self, role_matchers: List[str]) -> bool:
-        for role_matcher in role_matchers:
-            if self.match_role(role_matcher):
-                return True
-        return False
-
-    def set_redirect(self, url: str) -> None:
-        self._session["redirect_url"] = url
-
-    def get_redirect(self) -> str:
-        return self._session.get("redirect_url")
-
-    def generate_state(self) -> str:
-        self._session["state"] = str(uuid4())
-        return self._session["state"]
-
-    def validate_state(self, state: str) -> bool:
-        return state == self._session["state"]
-
-    def _cognito_url(self, path: str) -> str:
-        return (
-            f"{fix_url(self._config.cognito_domain)}/{path}?"
-            + f"client_id={self._config.client_id}&"
-            + "response_type=code&"
-            + f"scope={'+'.join(self._config.cognito_scopes)}&"
-            + f"redirect_uri={self._config.callback_url}&"
-            + f"state={self.generate_state()}"
+    def _refresh_public_keys(self, force: bool = False) -> None:
+        generation = self._jwks_generation
+        blocking = force or self._jwks_token is None
+        if not self._jwks_lock.acquire(
+            blocking, self._config.jwks_refresh_timeout if blocking else -1
+        ):
+            return
+        try:
+            if self._jwks_generation != generation or (
+                not force and self._public_keys_current()
+            ):
+                return
+            if not force and self._load_public_keys_snapshot():
+                return
+            self._fetch_public_keys()
+        finally:
+            self._jwks_lock.release()
+
+    def _refresh_public_keys_in_background(self) -> None:
+        if self._jwks_lock.locked() or (
+            self._jwks_refresh_thread is not None
+            and self._jwks_refresh_thread.is_alive()
+        ):
+            return
+        self._jwks_refresh_thread = Thread(
+            target=self._background_refresh_public_keys, daemon=True
         )
+        self._jwks_refresh_thread.start()
+
+    def _background_refresh_public_keys(self) -> None:
+        try:
+            self._refresh_public_keys()
+        except Exception:
+            logger.exception("Background JWKS refresh failed")
+
+    def _fetch_public_keys(self) -> None:
+        start = time.perf_counter()
+        self._jwks_fetched_at = time.monotonic()
+        try:
+            resp = self._http.get(self.public_key_url())
+            resp.raise_for_status()
+            jwks = resp.json()
+        except (requests.RequestException, ValueError) as error:
+            if not self._serve_stale_public_keys(error):
+                raise
+            return
+        finally:
+            self._jwks_fetch_latency = time.perf_counter() - start
+        self._save_public_keys_snapshot(self._public_keys_fetched(jwks, resp.headers))
+
+    def get_principal(self) -> Optional[Principal]:
+        if not self.logged_in():
+            return None
+        auth_data = self._auth_data()
+        access_token = auth_data.get("access_token")
+        claims = self.decode_token(access_token) if access_token else {}
+        return self._principal(auth_data, claims)
+
+    def _load_key(self, header: Dict[str, Any], payload: Any) -> Any:
+        return self.get_public_key(header.get("kid"))  # type: ignore
@@ -0,0 +1,565 @@
+import logging
+import os
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlencode
+from uuid import uuid4
+
+from authlib.jose import JWTClaims, jwt
+from authlib.jose.errors import DecodeError, JoseError
+from authlib.oauth2.rfc7636 import create_s256_code_challenge
+from cachecontrol import CacheController
+
+from .cache import DecisionCache, DecisionKey, TokenCache, roles_digest, token_digest
+from .claims import CognitoClaims, claims_options
+from .config import AuthConfig
+from .jwks import (
+    JWKSSnapshot,
+    compile_jwks,
+    load_jwks_snapshot,
+    save_jwks_snapshot,
+    snapshot_from_dict,
+    snapshot_to_dict,
+    token_kid,
+)
+from .metrics import Metrics, instrument
+from .policy import Policy, PolicyRules, compile_policy
+from .principal import Principal
+from .roles import (
+    RoleIndex,
+    RoleMatcher,
+    compile_matcher,
+    encode_roles,
+    load_role_index,
+    load_roles,
+)
+from .store import Store
+from .utils import fix_url
+
+logger = logging.getLogger(__name__)
+
+TokenResult = Union[JWTClaims, Exception]
+
+REFRESH_BLOCKING = "blocking"
+REFRESH_BACKGROUND = "background"
+BEARER_SCHEME = "bearer"
+JWKS_CACHE_KEY = "jwks"
+TOKEN_CACHE_PREFIX = "token:"
+
+
+class AuthDataWrite(NamedTuple):
+    stale_sid: Optional[str]
+    sid: str
+    auth_data: Dict[str, Any]
+    ttl: float
+
+
+class BaseAuth:
+    def __init__(
+        self,
+        config: AuthConfig,
+        session: Any,
+        store: Optional[Store] = None,
+        cache: Optional[Store] = None,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        self._config = config
+        self._session = session
+        self._store = store
+        self._cache = cache
+        self.metrics = metrics
+        self._jwks_expires_at: Optional[datetime] = None
+        self._jwks_stale_until = datetime.min
+        self._jwks_retry_at: Optional[datetime] = None
+        self._jwks_token = None
+        self._jwks_keys: Dict[str, Any] = {}
+        self._jwks_fetched_at = 0.0
+        self._jwks_loaded_at: Optional[float] = None
+        self._jwks_fetch_latency: Optional[float] = None
+        self._jwks_generation = 0
+        self._token_cache = TokenCache(config.token_cache_size)
+        self._refreshed_tokens = TokenCache(config.token_cache_size)
+        self._bearer_principals = TokenCache(config.token_cache_size)
+        self._decisions = DecisionCache(config.decision_cache_size)
+        self._claims_options = claims_options(config)
+        self._public_key_url = (
+            f"{fix_url(config.cognito_endpoint)}/.well-known/jwks.json"
+        )
+        domain = fix_url(config.cognito_domain)
+        self._token_url = f"{domain}/oauth2/token"
+        authorize_query = urlencode(
+            {
+                "client_id": config.client_id,
+                "response_type": "code",
+                "scope": " ".join(config.cognito_scopes),
+                "redirect_uri": config.callback_url,
+            }
+        )
+        self._login_url = f"{domain}/login?{authorize_query}&state="
+        self._logout_url = f"{domain}/logout?{authorize_query}&state="
+        if metrics is not None:
+            instrument(self, metrics)
+        self._load_public_keys_snapshot()
+
+    def login_url(self) -> str:
+        return self._cognito_url(self._login_url)
+
+    def logout_url(self) -> str:
+        return self._cognito_url(self._logout_url)
+
+    def public_key_url(self) -> str:
+        return self._public_key_url
+
+    def token_url(self) -> str:
+        return self._token_url
+
+    def logout(self) -> None:
+        if self._store is not None and "sid" in self._session:
+            self._store.delete(self._session["sid"])
+        self._session.clear()
+
+    def token_cache_stats(self) -> Dict[str, int]:
+        return self._token_cache.stats()
+
+    def decision_cache_stats(self) -> Dict[str, int]:
+        return self._decisions.stats()
+
+    def health(self) -> Dict[str, Any]:
+        now = datetime.now()
+        ready = self._jwks_token is not None and self._jwks_stale_until > now
+        key_age = None
+        if self._jwks_loaded_at is not None:
+            key_age = time.monotonic() - self._jwks_loaded_at
+        return {
+            "status": "ok" if ready else "unavailable",
+            "keys": len(self._jwks_keys),
+            "key_age": key_age,
+            "next_refresh_in": self._public_keys_next_refresh(now),
+            "last_fetch_latency": self._jwks_fetch_latency,
+        }
+
+    def get_username(self) -> str:
+        return self._auth_data().get("username")  # type: ignore
+
+    def get_roles(self) -> List[str]:
+        return list(load_roles(self._auth_data().get("roles")))
+
+    def get_role_index(self) -> RoleIndex:
+        return load_role_index(self._auth_data().get("roles"))
+
+    def match_role(self, role_matcher: Union[str, RoleMatcher]) -> bool:
+        return self._session_permitted(compile_policy(compile_matcher(role_matcher)))
+
+    def has_permission(self, role_matchers: PolicyRules) -> bool:
+        return self._session_permitted(compile_policy(role_matchers))
+
+    def principal_has_permission(
+        self, principal: Principal, role_matchers: PolicyRules
+    ) -> bool:
+        return self._permitted(
+            principal.roles, principal.roles_hash, compile_policy(role_matchers)
+        )
+
+    def set_redirect(self, url: str) -> None:
+        self._session["redirect_url"] = url
+
+    def get_redirect(self) -> str:
+        return self._session.get("redirect_url")
+
+    def generate_state(self) -> str:
+        self._session["state"] = str(uuid4())
+        return self._session["state"]
+
+    def validate_state(self, state: str) -> bool:
+        return state == self._session["state"]
+
+    def _auth_data(self) -> Mapping[str, Any]:
+        if self._store is None:
+            return self._session
+        sid = self._session.get("sid")
+        if sid is None:
+            return {}
+        return self._store.get(sid) or {}
+
+    def _save_auth_data(
+        self,
+        auth_info: Mapping[str, Any],
+        claims: Mapping[str, Any],
+        new_session: bool = False,
+    ) -> None:
+        write = self._prepare_auth_data(auth_info, claims, new_session)
+        if write is not None:
+            self._write_auth_data(write)
+
+    def _prepare_auth_data(
+        self,
+        auth_info: Mapping[str, Any],
+        claims: Mapping[str, Any],
+        new_session: bool = False,
+    ) -> Optional[AuthDataWrite]:
+        auth_data = {
+            "access_token": auth_info["access_token"],
+            "refresh_token": auth_info["refresh_token"],
+            "expires_at": auth_info["expires_at"],
+            "username": claims["username"],
+            "roles": encode_roles(claims.get("cognito:groups", [])),
+            "roles_hash": roles_digest(claims.get("cognito:groups", [])),
+        }
+        if self._store is None:
+            self._session.update(auth_data)
+            return None
+
+        sid = self._session.get("sid")
+        stale_sid = None
+        refresh_expires_at = None
+        if sid is not None and not new_session:
+            refresh_expires_at = self._auth_data().get("refresh_expires_at")
+        elif sid is not None:
+            stale_sid = sid
+        if sid is None or new_session:
+            sid = secrets.token_urlsafe(32)
+        if refresh_expires_at is None:
+            refresh_expires_at = time.time() + self._config.refresh_token_ttl
+        auth_data["refresh_expires_at"] = refresh_expires_at
+        expires_at = refresh_expires_at if auth_data["refresh_token"] else None
+        ttl = (expires_at or auth_data["expires_at"]) - time.time()
+        self._session["sid"] = sid
+        return AuthDataWrite(stale_sid, sid, auth_data, ttl)
+
+    def _write_auth_data(self, write: AuthDataWrite) -> None:
+        if write.stale_sid is not None:
+            self._store.delete(write.stale_sid)  # type: ignore
+        self._store.set(write.sid, write.auth_data, write.ttl)  # type: ignore
+
+    def _session_permitted(self, policy: Policy) -> bool:
+        auth_data = self._auth_data()
+        return self._permitted(
+            auth_data.get("roles"), auth_data.get("roles_hash"), policy
+        )
+
+    def _permitted(
+        self,
+        stored_roles: Any,
+        roles_hash: Optional[str],
+        policy: Policy,
+    ) -> bool:
+        key = (roles_hash or roles_digest(load_roles(stored_roles)), policy)
+        permitted = self._cached_decision(key)
+        if permitted is None:
+            permitted = policy.evaluate(load_role_index(stored_roles))
+            self._decisions.set(key, permitted)
+        return permitted
+
+    def _cached_decision(self, key: DecisionKey) -> Optional[bool]:
+        return self._decisions.get(key)
+
+    def _access_token_expiring(self, auth_data: Mapping[str, Any]) -> bool:
+        expires_at = auth_data.get("expires_at")
+        if not isinstance(expires_at, (int, float)):
+            return False
+        return expires_at - self._config.token_refresh_skew <= time.time()
+
+    def _refreshed_auth_info(
+        self, refresh_token: str, auth_info: Mapping[str, Any]
+    ) -> Mapping[str, Any]:
+        if "refresh_token" not in auth_info:
+            return dict(auth_info, refresh_token=refresh_token)
+        return auth_info
+
+    def _verify_token(
+        self, access_token: str, load_key: Callable[[Dict[str, Any], Any], Any]
+    ) -> JWTClaims:
+        claims = jwt.decode(
+            access_token,
+            load_key,
+            claims_cls=CognitoClaims,
+            claims_options=self._claims_options,
+        )
+        claims.validate(leeway=self._config.token_leeway)
+        expires_at = claims.get("exp")
+        if isinstance(expires_at, (int, float)):
+            self._token_cache.set(access_token, claims, expires_at)
+            if self._shares_tokens():
+                self._cache_set(
+                    TOKEN_CACHE_PREFIX + token_digest(access_token),
+                    {"claims": dict(claims), "header": claims.header},
+                    expires_at - time.time(),
+                )
+        return claims
+
+    def _cached_claims(self, access_token: str) -> Optional[JWTClaims]:
+        claims = self._token_cache.get(access_token)
+        if claims is not None or not self._shares_tokens():
+            return claims
+        entry = self._cache_get(TOKEN_CACHE_PREFIX + token_digest(access_token))
+        if entry is None:
+            return None
+        header = entry.get("header") or {}
+        expires_at = entry.get("claims", {}).get("exp")
+        if (
+            not isinstance(expires_at, (int, float))
+            or expires_at <= time.time()
+            or self._lookup_public_key(header.get("kid")) is None
+        ):
+            return None
+        claims = CognitoClaims(entry["claims"], header, self._claims_options)
+        self._token_cache.set(access_token, claims, expires_at)
+        return claims
+
+    def _shares_tokens(self) -> bool:
+        return self._cache is not None and self._config.shared_token_cache
+
+    def _cache_get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            return self._cache.get(key)  # type: ignore
+        except Exception:
+            logger.warning("Could not read from the shared cache", exc_info=True)
+            return None
+
+    def _cache_set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        try:
+            self._cache.set(key, value, ttl)  # type: ignore
+        except Exception:
+            logger.warning("Could not write to the shared cache", exc_info=True)
+
+    def _pending_tokens(
+        self, tokens: Iterable[str], results: Dict[str, TokenResult]
+    ) -> Dict[Optional[str], List[str]]:
+        pending: Dict[Optional[str], List[str]] = {}
+        for token in dict.fromkeys(tokens):
+            claims = self._cached_claims(token)
+            if claims is not None:
+                results[token] = claims
+                continue
+            try:
+                kid = token_kid(token)
+            except DecodeError as error:
+                results[token] = error
+                continue
+            pending.setdefault(kid, []).append(token)
+        return pending
+
+    def _verify_pending_tokens(
+        self,
+        pending: Dict[Optional[str], List[str]],
+        keys: Mapping[Optional[str], Any],
+        results: Dict[str, TokenResult],
+        max_workers: Optional[int] = None,
+    ) -> None:
+        jobs: List[Tuple[str, Any]] = []
+        for kid, tokens in pending.items():
+            key = keys[kid]
+            if isinstance(key, Exception):
+                results.update(dict.fromkeys(tokens, key))
+            else:
+                jobs.extend((token, key) for token in tokens)
+        workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+        if workers <= 1:
+            results.update(zip([token for token, _ in jobs], self._verify_jobs(jobs)))
+            return
+        chunks = [jobs[index::workers] for index in range(workers)]
+        with ThreadPoolExecutor(workers) as executor:
+            for chunk, verified in zip(chunks, executor.map(self._verify_jobs, chunks)):
+                results.update(zip([token for token, _ in chunk], verified))
+
+    def _verify_jobs(self, jobs: List[Tuple[str, Any]]) -> List[TokenResult]:
+        return [self._verify_job(job) for job in jobs]
+
+    def _verify_job(self, job: Tuple[str, Any]) -> TokenResult:
+        token, key = job
+        try:
+            return self._verify_token(token, lambda header, payload: key)
+        except (JoseError, ValueError) as error:
+            return error
+
+    def _bearer_token(self, authorization: Optional[str]) -> Optional[str]:
+        if not authorization:
+            return None
+        scheme, _, token = authorization.partition(" ")
+        if not token or scheme.lower() != BEARER_SCHEME:
+            return None
+        return token
+
+    def _bearer_principal(self, access_token: str, claims: JWTClaims) -> Principal:
+        expires_at = claims.get("exp")
+        roles = tuple(claims.get("cognito:groups", ()))
+        principal = Principal(
+            username=claims.get("username"),  # type: ignore
+            roles=roles,
+            claims=claims,
+            expires_at=expires_at,
+            roles_hash=roles_digest(roles),
+        )
+        if isinstance(expires_at, (int, float)):
+            self._bearer_principals.set(access_token, principal, expires_at)
+        return principal
+
+    def _principal(
+        self, auth_data: Mapping[str, Any], claims: Mapping[str, Any]
+    ) -> Principal:
+        return Principal(
+            username=auth_data.get("username"),  # type: ignore
+            roles=load_roles(auth_data.get("roles")),
+            claims=dict(claims),
+            expires_at=claims.get("exp", auth_data.get("expires_at")),
+            roles_hash=auth_data.get("roles_hash"),
+        )
+
+    def _public_keys_refresh_mode(self, force: bool = False) -> Optional[str]:
+        if force or self._jwks_token is None or self._jwks_expires_at is None:
+            return REFRESH_BLOCKING
+        if self._public_keys_retry_pending():
+            return None
+        if self._jwks_expires_at <= datetime.now():
+            if self._public_keys_revalidating():
+                return REFRESH_BACKGROUND
+            return REFRESH_BLOCKING
+        if self._public_keys_expiring():
+            return REFRESH_BACKGROUND
+        return None
+
+    def _public_keys_current(self) -> bool:
+        return (
+            self._jwks_token is not None
+            and self._jwks_expires_at is not None
+            and self._jwks_expires_at > datetime.now()
+            and not self._public_keys_expiring()
+        )
+
+    def _public_keys_expiring(self) -> bool:
+        if self._config.jwks_refresh_ahead <= 0:
+            return False
+        refresh_ahead = timedelta(seconds=self._config.jwks_refresh_ahead)
+        return self._jwks_expires_at - refresh_ahead <= datetime.now()  # type: ignore
+
+    def _public_keys_retry_pending(self) -> bool:
+        return self._jwks_retry_at is not None and self._jwks_retry_at > datetime.now()
+
+    def _public_keys_revalidating(self) -> bool:
+        stale_for = timedelta(seconds=self._config.jwks_stale_while_revalidate)
+        return datetime.now() < self._jwks_expires_at + stale_for  # type: ignore
+
+    def _public_keys_next_refresh(self, now: datetime) -> Optional[float]:
+        if self._jwks_expires_at is None:
+            return None
+        if self._public_keys_retry_pending():
+            return (self._jwks_retry_at - now).total_seconds()  # type: ignore
+        refresh_at = self._jwks_expires_at - timedelta(
+            seconds=max(self._config.jwks_refresh_ahead, 0)
+        )
+        return max((refresh_at - now).total_seconds(), 0.0)
+
+    def _lookup_public_key(self, kid: Optional[str]) -> Any:
+        return self._jwks_keys.get(kid)  # type: ignore
+
+    def _can_refetch_public_keys(self) -> bool:
+        elapsed = time.monotonic() - self._jwks_fetched_at
+        return elapsed >= self._config.jwks_refetch_interval
+
+    def _serve_stale_public_keys(self, error: Exception) -> bool:
+        if self._jwks_token is None or self._jwks_stale_until <= datetime.now():
+            return False
+        logger.warning("JWKS refresh failed, serving stale keys", exc_info=True)
+        if self.metrics is not None:
+            self.metrics.failure("jwks_fetch", type(error).__name__)
+        retry_at = datetime.now() + timedelta(
+            seconds=self._config.jwks_refetch_interval
+        )
+        self._jwks_expires_at = min(retry_at, self._jwks_stale_until)
+        self._jwks_retry_at = self._jwks_expires_at
+        return True
+
+    def _public_keys_fetched(self, jwks: Dict[str, Any], headers: Any) -> JWKSSnapshot:
+        expires_at = datetime.now() + timedelta(seconds=self._public_keys_ttl(headers))
+        snapshot = JWKSSnapshot(
+            jwks=jwks,
+            expires_at=expires_at,
+            stale_until=expires_at
+            + timedelta(seconds=self._config.jwks_stale_if_error),
+        )
+        self._set_public_keys(snapshot)
+        return snapshot
+
+    def _public_keys_ttl(self, headers: Any) -> float:
+        cache_control = CacheController().parse_cache_control(headers)
+        max_age = float(cache_control.get("max-age", 0))
+        return min(max(max_age, self._config.jwks_min_ttl), self._config.jwks_max_ttl)
+
+    def _set_public_keys(self, snapshot: JWKSSnapshot) -> None:
+        if snapshot.jwks != self._jwks_token:
+            self._jwks_keys = compile_jwks(snapshot.jwks)
+            self._token_cache.clear()
+            self._bearer_principals.clear()
+        self._jwks_token = snapshot.jwks  # type: ignore
+        self._jwks_expires_at = snapshot.expires_at
+        self._jwks_stale_until = snapshot.stale_until
+        self._jwks_retry_at = None
+        self._jwks_loaded_at = time.monotonic()
+        self._jwks_generation += 1
+
+    def _load_public_keys_snapshot(self) -> bool:
+        for snapshot in self._public_keys_snapshots():
+            if (
+                snapshot is not None
+                and snapshot.expires_at > datetime.now()
+                and (
+                    self._jwks_expires_at is None
+                    or snapshot.expires_at > self._jwks_expires_at
+                )
+            ):
+                self._set_public_keys(snapshot)
+                return True
+        return False
+
+    def _public_keys_snapshots(self) -> Iterator[Optional[JWKSSnapshot]]:
+        if self._cache is not None:
+            entry = self._cache_get(JWKS_CACHE_KEY)
+            yield snapshot_from_dict(entry) if entry is not None else None
+        if self._config.jwks_cache_path is not None:
+            yield load_jwks_snapshot(self._config.jwks_cache_path)
+
+    def _save_public_keys_snapshot(self, snapshot: JWKSSnapshot) -> None:
+        if self._cache is not None:
+            self._cache_set(
+                JWKS_CACHE_KEY,
+                snapshot_to_dict(snapshot),
+                (snapshot.stale_until - datetime.now()).total_seconds(),
+            )
+        if self._config.jwks_cache_path is None:
+            return
+        try:
+            save_jwks_snapshot(self._config.jwks_cache_path, snapshot)
+        except OSError:
+            logger.warning("Could not write JWKS snapshot", exc_info=True)
+
+    def _cognito_url(self, url: str) -> str:
+        url += self.generate_state()
+        if self._config.pkce:
+            code_verifier = secrets.token_urlsafe(64)
+            self._session["code_verifier"] = code_verifier
+            url += (
+                f"&code_challenge={create_s256_code_challenge(code_verifier)}"
+                + "&code_challenge_method=S256"
+            )
+        return url
+
+    def _code_verifier(self) -> Dict[str, str]:
+        code_verifier = self._session.pop("code_verifier", None)
+        if not self._config.pkce or code_verifier is None:
+            return {}
+        return {"code_verifier": code_verifier}
@@ -1,8 +1,11 @@
-from collections import Callable
+from typing import Callable
 
-from flask import Blueprint, current_app, redirect, request
+from flask import Blueprint, current_app, jsonify, redirect, request
 from werkzeug.wrappers import Response
 
+from .decorator import has_permission
+from .policy import all_of, any_of, none_of
+
 
 class AuthBlueprint:
     def __init__(self, default_url: str = "/", url_prefix: str = "/auth") -> None:
@@ -15,6 +18,9 @@ class AuthBlueprint:
     def blueprint(self) -> Blueprint:
         self.add_route("/callback", self.callback)
         self.add_route("/logout", self.logout)
+        self.add_route("/health", self.health)
+        for template_global in (has_permission, all_of, any_of, none_of):
+            self.auth_blueprint.add_app_template_global(template_global)
         return self.auth_blueprint
 
     def add_route(self, route: str, view_func: Callable) -> None:
@@ -34,3 +40,9 @@ class AuthBlueprint:
     def logout(self) -> Response:
         current_app.auth.logout()
         return redirect(current_app.auth.logout_url())
+
+    def health(self) -> Response:
+        health = current_app.auth.health()
+        response = jsonify(health)
+        response.status_code = 200 if health["status"] == "ok" else 503
+        return response
@@ -0,0 +1,40 @@
+from typing import Any, Dict, Optional
+
+from authlib.jose import JWTClaims
+from authlib.jose.errors import InvalidClaimError, MissingClaimError
+
+from .config import AuthConfig
+from .utils import fix_url
+
+
+class CognitoClaims(JWTClaims):
+    REGISTERED_CLAIMS = JWTClaims.REGISTERED_CLAIMS + ["client_id", "token_use"]
+
+    def validate(self, now: Optional[int] = None, leeway: int = 0) -> None:
+        super().validate(now, leeway)
+        self.validate_client_id()
+        self.validate_token_use()
+
+    def validate_client_id(self) -> None:
+        option = self.options.get("client_id")
+        if not option:
+            return
+        client_id = self.get("client_id", self.get("aud"))
+        if client_id is None:
+            raise MissingClaimError("client_id")
+        if client_id != option["value"]:
+            raise InvalidClaimError("client_id")
+
+    def validate_token_use(self) -> None:
+        self._validate_claim_value("token_use")
+
+
+def claims_options(config: AuthConfig) -> Dict[str, Any]:
+    options: Dict[str, Any] = {}
+    if config.verify_issuer:
+        options["iss"] = {"essential": True, "value": fix_url(config.cognito_endpoint)}
+    if config.verify_client_id:
+        options["client_id"] = {"value": config.client_id}
+    if config.token_use:
+        options["token_use"] = {"essential": True, "value": config.token_use}
+    return options
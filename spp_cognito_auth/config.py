@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import List, Optional
 
 DEFAULT_SCOPES = [
     "aws.cognito.signin.user.admin",
@@ -19,6 +19,29 @@ class AuthConfig:
     cognito_domain: str
     cognito_endpoint: str
     cognito_scopes: List[str] = field(default_factory=lambda: DEFAULT_SCOPES)
+    pkce: bool = False
+    token_cache_size: int = 1024
+    decision_cache_size: int = 4096
+    token_refresh_skew: int = 60
+    token_leeway: int = 0
+    token_use: Optional[str] = "access"
+    verify_issuer: bool = True
+    verify_client_id: bool = True
+    refresh_token_ttl: int = 2592000
+    jwks_refetch_interval: int = 30
+    jwks_refresh_ahead: int = 60
+    jwks_refresh_timeout: float = 10
+    jwks_min_ttl: int = 300
+    jwks_max_ttl: int = 86400
+    jwks_stale_while_revalidate: int = 300
+    jwks_stale_if_error: int = 86400
+    jwks_cache_path: Optional[str] = None
+    shared_token_cache: bool = True
+    http_pool_size: int = 10
+    http_connect_timeout: float = 3.05
+    http_read_timeout: float = 10
+    http_retries: int = 3
+    http_backoff_factor: float = 0.3
 
     @classmethod
     def from_env(cls) -> "AuthConfig":
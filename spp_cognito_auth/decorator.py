@@ -1,26 +1,111 @@
 from functools import wraps
 
-from flask import abort, current_app, redirect, request
+from flask import Response, abort, current_app, g, redirect, request
+from werkzeug.datastructures import MIMEAccept
+from werkzeug.http import parse_accept_header
+
+from .policy import compile_policy
+
+PRINCIPAL_KEY = "spp_cognito_auth_principal"
+PERMISSIONS_KEY = "spp_cognito_auth_permissions"
+BEARER_KEY = "spp_cognito_auth_bearer"
+BEARER_CHALLENGE = "Bearer"
+INVALID_TOKEN_CHALLENGE = 'Bearer error="invalid_token"'
+SESSION_CHALLENGE = 'Session realm="login"'
+NAVIGATION_TYPES = ("text/html", "application/json")
+
+
+def current_principal():
+    if PRINCIPAL_KEY not in g:
+        setattr(g, PRINCIPAL_KEY, current_app.auth.get_principal())
+    return getattr(g, PRINCIPAL_KEY)
+
+
+def bearer_principal():
+    if PRINCIPAL_KEY not in g:
+        setattr(g, BEARER_KEY, True)
+        setattr(
+            g,
+            PRINCIPAL_KEY,
+            current_app.auth.get_bearer_principal(request.headers.get("Authorization")),
+        )
+    return getattr(g, PRINCIPAL_KEY)
+
+
+def has_permission(role_matchers):
+    policy = compile_policy(role_matchers)
+    permissions = g.setdefault(PERMISSIONS_KEY, {})
+    if policy not in permissions:
+        if g.get(BEARER_KEY):
+            principal = getattr(g, PRINCIPAL_KEY)
+            permitted = (
+                principal is not None
+                and current_app.auth.principal_has_permission(principal, policy)
+            )
+        else:
+            permitted = current_app.auth.has_permission(policy)
+        permissions[policy] = permitted
+    return permissions[policy]
+
+
+def is_navigation(headers):
+    mode = headers.get("Sec-Fetch-Mode")
+    if mode is not None:
+        return mode == "navigate"
+    if headers.get("X-Requested-With") == "XMLHttpRequest":
+        return False
+    accept = parse_accept_header(headers.get("Accept"), MIMEAccept)
+    return accept.best_match(NAVIGATION_TYPES) != "application/json"
+
+
+def record_denied(status):
+    metrics = current_app.auth.metrics
+    if metrics is not None:
+        metrics.denied(request.endpoint, status)
+
+
+def unauthorized():
+    record_denied(401)
+    if "Authorization" in request.headers:
+        challenge = INVALID_TOKEN_CHALLENGE
+    else:
+        challenge = BEARER_CHALLENGE
+    return Response(status=401, headers={"WWW-Authenticate": challenge})
 
 
 def requires_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if current_app.auth.logged_in():
+        if current_principal() is not None:
             return f(*args, **kwargs)
+        record_denied(401)
+        if not is_navigation(request.headers):
+            return Response(status=401, headers={"WWW-Authenticate": SESSION_CHALLENGE})
         current_app.auth.set_redirect(request.url)
         return redirect(current_app.auth.login_url())
 
     return decorated
 
 
+def requires_bearer_auth(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if bearer_principal() is not None:
+            return f(*args, **kwargs)
+        return unauthorized()
+
+    return decorated
+
+
 def requires_role(required_roles):
+    policy = compile_policy(required_roles)
+
     def decorator(f):
         @wraps(f)
         def decorated(*args, **kwargs):
-            for role in required_roles:
-                if current_app.auth.match_role(role):
-                    return f(*args, **kwargs)
+            if has_permission(policy):
+                return f(*args, **kwargs)
+            record_denied(403)
             abort(403)
 
         return decorated
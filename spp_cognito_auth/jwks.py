@@ -0,0 +1,74 @@
+import json
+import os
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, NamedTuple, Optional
+
+from authlib.common.encoding import json_loads, to_bytes, urlsafe_b64decode
+from authlib.jose import JsonWebKey
+from authlib.jose.errors import DecodeError
+
+
+class JWKSSnapshot(NamedTuple):
+    jwks: Dict[str, Any]
+    expires_at: datetime
+    stale_until: datetime
+
+
+def compile_jwks(jwks: Dict[str, Any]) -> Dict[str, Any]:
+    keys = {}
+    for jwk in jwks.get("keys", []):
+        try:
+            keys[jwk.get("kid")] = JsonWebKey.import_key(jwk)
+        except (KeyError, ValueError):
+            continue
+    return keys
+
+
+def snapshot_to_dict(snapshot: JWKSSnapshot) -> Dict[str, Any]:
+    return {
+        "jwks": snapshot.jwks,
+        "expires_at": snapshot.expires_at.timestamp(),
+        "stale_until": snapshot.stale_until.timestamp(),
+    }
+
+
+def snapshot_from_dict(snapshot: Dict[str, Any]) -> Optional[JWKSSnapshot]:
+    try:
+        return JWKSSnapshot(
+            jwks=snapshot["jwks"],
+            expires_at=datetime.fromtimestamp(snapshot["expires_at"]),
+            stale_until=datetime.fromtimestamp(snapshot["stale_until"]),
+        )
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def load_jwks_snapshot(path: str) -> Optional[JWKSSnapshot]:
+    try:
+        with open(path) as snapshot_file:
+            return snapshot_from_dict(json.load(snapshot_file))
+    except (OSError, ValueError):
+        return None
+
+
+def save_jwks_snapshot(path: str, snapshot: JWKSSnapshot) -> None:
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".jwks-")
+    try:
+        with os.fdopen(fd, "w") as snapshot_file:
+            json.dump(snapshot_to_dict(snapshot), snapshot_file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def token_kid(token: str) -> Optional[str]:
+    try:
+        header = json_loads(urlsafe_b64decode(to_bytes(token.split(".", 1)[0])))
+    except (ValueError, TypeError, AttributeError):
+        raise DecodeError("Invalid token header")
+    if not isinstance(header, dict):
+        raise DecodeError("Invalid token header")
+    return header.get("kid")
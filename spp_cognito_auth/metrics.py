@@ -0,0 +1,140 @@
+import inspect
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Optional
+
+TIMED_OPERATIONS = {
+    "get_public_keys": "get_public_keys",
+    "_fetch_public_keys": "jwks_fetch",
+    "get_auth_token": "token_exchange",
+    "get_refreshed_token": "token_refresh",
+    "_verify_token": "token_verify",
+    "match_role": "match_role",
+    "has_permission": "has_permission",
+}
+
+
+class Metrics:
+    def observe(self, operation: str, seconds: float) -> None:
+        pass
+
+    def cache(self, cache: str, hit: bool) -> None:
+        pass
+
+    def failure(self, operation: str, reason: str) -> None:
+        pass
+
+    def denied(self, endpoint: Optional[str], status: int) -> None:
+        pass
+
+
+class CallbackMetrics(Metrics):
+    def __init__(self, callback: Callable[[str, float, Dict[str, Any]], None]) -> None:
+        self._callback = callback
+
+    def observe(self, operation: str, seconds: float) -> None:
+        self._callback("latency", seconds, {"operation": operation})
+
+    def cache(self, cache: str, hit: bool) -> None:
+        self._callback("cache", 1, {"cache": cache, "hit": hit})
+
+    def failure(self, operation: str, reason: str) -> None:
+        self._callback("failure", 1, {"operation": operation, "reason": reason})
+
+    def denied(self, endpoint: Optional[str], status: int) -> None:
+        self._callback("denied", 1, {"endpoint": endpoint, "status": status})
+
+
+class PrometheusMetrics(Metrics):
+    def __init__(self, registry: Any = None, namespace: str = "spp_cognito_auth"):
+        from prometheus_client import REGISTRY, Counter, Histogram
+
+        registry = REGISTRY if registry is None else registry
+        self._latency = Histogram(
+            "operation_seconds",
+            "Latency of auth operations",
+            ["operation"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self._cache = Counter(
+            "cache_lookups",
+            "Cache lookups by result",
+            ["cache", "result"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self._failures = Counter(
+            "failures",
+            "Failed auth operations by reason",
+            ["operation", "reason"],
+            namespace=namespace,
+            registry=registry,
+        )
+        self._denied = Counter(
+            "denied_requests",
+            "Requests refused by the auth decorators",
+            ["endpoint", "status"],
+            namespace=namespace,
+            registry=registry,
+        )
+
+    def observe(self, operation: str, seconds: float) -> None:
+        self._latency.labels(operation).observe(seconds)
+
+    def cache(self, cache: str, hit: bool) -> None:
+        self._cache.labels(cache, "hit" if hit else "miss").inc()
+
+    def failure(self, operation: str, reason: str) -> None:
+        self._failures.labels(operation, reason).inc()
+
+    def denied(self, endpoint: Optional[str], status: int) -> None:
+        self._denied.labels(endpoint or "", str(status)).inc()
+
+
+def instrument(auth: Any, metrics: Metrics) -> None:
+    for method, operation in TIMED_OPERATIONS.items():
+        if hasattr(auth, method):
+            setattr(auth, method, timed(metrics, operation, getattr(auth, method)))
+    auth._cached_claims = counted(metrics, "token", auth._cached_claims)
+    auth._cached_decision = counted(metrics, "decision", auth._cached_decision)
+
+
+def timed(metrics: Metrics, operation: str, func: Callable) -> Callable:
+    if inspect.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def timed_coroutine(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception as error:
+                metrics.failure(operation, type(error).__name__)
+                raise
+            finally:
+                metrics.observe(operation, time.perf_counter() - start)
+
+        return timed_coroutine
+
+    @wraps(func)
+    def timed_function(*args: Any, **kwargs: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as error:
+            metrics.failure(operation, type(error).__name__)
+            raise
+        finally:
+            metrics.observe(operation, time.perf_counter() - start)
+
+    return timed_function
+
+
+def counted(metrics: Metrics, cache: str, func: Callable) -> Callable:
+    @wraps(func)
+    def counted_lookup(*args: Any, **kwargs: Any) -> Any:
+        value = func(*args, **kwargs)
+        metrics.cache(cache, value is not None)
+        return value
+
+    return counted_lookup
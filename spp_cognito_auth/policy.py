@@ -0,0 +1,105 @@
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Mapping, Tuple, Union
+
+from .roles import RoleIndex, RoleMatcher, compile_matcher
+
+ALL_OF = "all_of"
+ANY_OF = "any_of"
+NONE_OF = "none_of"
+OPERATORS = (ALL_OF, ANY_OF, NONE_OF)
+
+
+class Policy:
+    __slots__ = ("operator", "rules", "_hash")
+
+    def __init__(
+        self, operator: str, rules: Iterable[Union[RoleMatcher, "Policy"]]
+    ) -> None:
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown policy operator {operator!r}")
+        self.operator = operator
+        self.rules: Tuple[Union[RoleMatcher, Policy], ...] = tuple(rules)
+        self._hash = hash((operator, self.rules))
+
+    def evaluate(self, index: RoleIndex) -> bool:
+        return self._evaluate(index, {})
+
+    def _evaluate(self, index: RoleIndex, matched: Dict[RoleMatcher, bool]) -> bool:
+        results = (
+            rule._evaluate(index, matched)
+            if isinstance(rule, Policy)
+            else _match(index, rule, matched)
+            for rule in self.rules
+        )
+        if self.operator == ALL_OF:
+            return all(results)
+        if self.operator == ANY_OF:
+            return any(results)
+        return not any(results)
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            isinstance(other, Policy)
+            and other.operator == self.operator
+            and other.rules == self.rules
+        )
+
+    def __hash__(self) -> int:
+        return self._hash
+
+    def __repr__(self) -> str:
+        rules = ", ".join(
+            repr(rule.matcher) if isinstance(rule, RoleMatcher) else repr(rule)
+            for rule in self.rules
+        )
+        return f"{self.operator}({rules})"
+
+
+PolicyRules = Union[str, RoleMatcher, Policy, Mapping[str, Any], Iterable[Any]]
+
+
+def _match(
+    index: RoleIndex, matcher: RoleMatcher, matched: Dict[RoleMatcher, bool]
+) -> bool:
+    if matcher not in matched:
+        matched[matcher] = index.match(matcher)
+    return matched[matcher]
+
+
+def all_of(*rules: PolicyRules) -> Policy:
+    return _policy(ALL_OF, tuple(compile_rule(rule) for rule in rules))
+
+
+def any_of(*rules: PolicyRules) -> Policy:
+    return _policy(ANY_OF, tuple(compile_rule(rule) for rule in rules))
+
+
+def none_of(*rules: PolicyRules) -> Policy:
+    return _policy(NONE_OF, tuple(compile_rule(rule) for rule in rules))
+
+
+def compile_policy(rules: PolicyRules) -> Policy:
+    rule = compile_rule(rules)
+    if isinstance(rule, RoleMatcher):
+        return _policy(ANY_OF, (rule,))
+    return rule
+
+
+def compile_rule(rule: PolicyRules) -> Union[RoleMatcher, Policy]:
+    if isinstance(rule, (Policy, RoleMatcher)):
+        return rule
+    if isinstance(rule, str):
+        return compile_matcher(rule)
+    if isinstance(rule, Mapping):
+        if len(rule) != 1:
+            raise ValueError(f"A policy needs exactly one operator, got {list(rule)}")
+        ((operator, rules),) = rule.items()
+        if isinstance(rules, (str, Mapping)):
+            rules = [rules]
+        return _policy(operator, tuple(compile_rule(item) for item in rules))
+    return _policy(ANY_OF, tuple(compile_rule(item) for item in rule))
+
+
+@lru_cache(maxsize=1024)
+def _policy(operator: str, rules: Tuple[Union[RoleMatcher, Policy], ...]) -> Policy:
+    return Policy(operator, rules)
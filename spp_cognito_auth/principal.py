@@ -0,0 +1,17 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from .policy import PolicyRules, compile_policy
+from .roles import role_index
+
+
+@dataclass(frozen=True)
+class Principal:
+    username: str
+    roles: Tuple[str, ...] = ()
+    claims: Dict[str, Any] = field(default_factory=dict)
+    expires_at: Optional[int] = None
+    roles_hash: Optional[str] = field(default=None, compare=False, repr=False)
+
+    def has_permission(self, role_matchers: PolicyRules) -> bool:
+        return compile_policy(role_matchers).evaluate(role_index(self.roles))
@@ -0,0 +1,160 @@
+import string
+from functools import lru_cache
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
+
+WILDCARD = "*"
+ROLES_FORMAT = "1:"
+ROLES_SEPARATOR = ","
+ROLES_ESCAPE = "\\"
+SHARED_PREFIX_DIGITS = string.digits + string.ascii_letters
+
+
+class RoleMatcher:
+    __slots__ = ("matcher", "segments", "exact")
+
+    def __init__(self, matcher: str) -> None:
+        self.matcher = matcher
+        self.segments: Tuple[Optional[str], ...] = tuple(
+            None if segment == WILDCARD else segment for segment in matcher.split(".")
+        )
+        self.exact = None not in self.segments
+
+    def __eq__(self, other: Any) -> bool:
+        return isinstance(other, RoleMatcher) and other.matcher == self.matcher
+
+    def __hash__(self) -> int:
+        return hash(self.matcher)
+
+    def __repr__(self) -> str:
+        return f"RoleMatcher({self.matcher!r})"
+
+
+class RoleIndex:
+    __slots__ = ("roles", "_trie")
+
+    def __init__(self, roles: Iterable[str]) -> None:
+        self.roles: FrozenSet[str] = frozenset(roles)
+        self._trie: Dict[Optional[str], Any] = {}
+        for role in self.roles:
+            node = self._trie
+            for segment in role.split("."):
+                node = node.setdefault(segment, {})
+            node[None] = True
+
+    def match(self, matcher: RoleMatcher) -> bool:
+        if matcher.exact:
+            return matcher.matcher in self.roles
+        nodes: List[Dict[Optional[str], Any]] = [self._trie]
+        for segment in matcher.segments:
+            if segment is None:
+                nodes = [
+                    child
+                    for node in nodes
+                    for key, child in node.items()
+                    if key is not None
+                ]
+            else:
+                nodes = [node[segment] for node in nodes if segment in node]
+            if not nodes:
+                return False
+        return any(None in node for node in nodes)
+
+    def match_any(self, matchers: Iterable[RoleMatcher]) -> bool:
+        return any(self.match(matcher) for matcher in matchers)
+
+
+@lru_cache(maxsize=1024)
+def _compile_matcher(matcher: str) -> RoleMatcher:
+    return RoleMatcher(matcher)
+
+
+def compile_matcher(matcher: Union[str, RoleMatcher]) -> RoleMatcher:
+    if isinstance(matcher, RoleMatcher):
+        return matcher
+    return _compile_matcher(matcher)
+
+
+def compile_matchers(
+    matchers: Iterable[Union[str, RoleMatcher]]
+) -> Tuple[RoleMatcher, ...]:
+    return tuple(compile_matcher(matcher) for matcher in matchers)
+
+
+@lru_cache(maxsize=256)
+def role_index(roles: Tuple[str, ...]) -> RoleIndex:
+    return RoleIndex(roles)
+
+
+def encode_roles(roles: Iterable[str]) -> str:
+    entries = []
+    previous = ""
+    for role in sorted(set(roles)):
+        limit = min(len(role), len(previous), len(SHARED_PREFIX_DIGITS) - 1)
+        shared = 0
+        while shared < limit and role[shared] == previous[shared]:
+            shared += 1
+        suffix = role[shared:].replace(ROLES_ESCAPE, ROLES_ESCAPE * 2)
+        entries.append(
+            SHARED_PREFIX_DIGITS[shared]
+            + suffix.replace(ROLES_SEPARATOR, ROLES_ESCAPE + ROLES_SEPARATOR)
+        )
+        previous = role
+    return ROLES_FORMAT + ROLES_SEPARATOR.join(entries)
+
+
+@lru_cache(maxsize=256)
+def decode_roles(encoded: str) -> Tuple[str, ...]:
+    if not encoded.startswith(ROLES_FORMAT):
+        raise ValueError(f"Unsupported roles encoding {encoded[:8]!r}")
+    roles = []
+    previous = ""
+    for entry in _split_roles(encoded.split(ROLES_FORMAT, 1)[1]):
+        previous = previous[: SHARED_PREFIX_DIGITS.index(entry[0])] + entry[1:]
+        roles.append(previous)
+    return tuple(roles)
+
+
+def _split_roles(encoded: str) -> Iterator[str]:
+    if not encoded:
+        return
+    if ROLES_ESCAPE not in encoded:
+        yield from encoded.split(ROLES_SEPARATOR)
+        return
+    entry: List[str] = []
+    chars = iter(encoded)
+    for char in chars:
+        if char == ROLES_ESCAPE:
+            entry.append(next(chars, ""))
+        elif char == ROLES_SEPARATOR:
+            yield "".join(entry)
+            entry = []
+        else:
+            entry.append(char)
+    yield "".join(entry)
+
+
+def load_roles(stored: Any) -> Tuple[str, ...]:
+    if isinstance(stored, str):
+        return decode_roles(stored)
+    return tuple(stored or ())
+
+
+def load_role_index(stored: Any) -> RoleIndex:
+    if isinstance(stored, str):
+        return _encoded_role_index(stored)
+    return role_index(tuple(stored or ()))
+
+
+@lru_cache(maxsize=256)
+def _encoded_role_index(encoded: str) -> RoleIndex:
+    return RoleIndex(decode_roles(encoded))
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import math
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+
+class Store(ABC):
+    blocking = True
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+
+class MemoryStore(Store):
+    blocking = False
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            self.delete(key)
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FileStore(Store):
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._path(key)
+        try:
+            with open(path) as entry_file:
+                entry = json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+        if entry["expires_at"] <= time.time():
+            self._remove(path)
+            return None
+        return entry["value"]
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            self.delete(key)
+            return
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "w") as entry_file:
+                json.dump({"expires_at": time.time() + ttl, "value": value}, entry_file)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+
+    def delete(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def purge(self) -> None:
+        for name in os.listdir(self.directory):
+            if not name.startswith("."):
+                path = os.path.join(self.directory, name)
+                try:
+                    with open(path) as entry_file:
+                        expires_at = json.load(entry_file)["expires_at"]
+                except (OSError, ValueError, KeyError):
+                    continue
+                if expires_at <= time.time():
+                    self._remove(path)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(
+            self.directory, hashlib.sha256(key.encode("utf-8")).hexdigest()
+        )
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class RedisStore(Store):
+    def __init__(self, client: Any, prefix: str = "spp-cognito-auth:") -> None:
+        self._client = client
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        value = self._client.get(self.prefix + key)
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Dict[str, Any], ttl: float) -> None:
+        if ttl <= 0:
+            self.delete(key)
+            return
+        self._client.set(self.prefix + key, json.dumps(value), ex=math.ceil(ttl))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
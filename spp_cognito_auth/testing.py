@@ -0,0 +1,275 @@
+import base64
+import json
+import secrets
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, unquote, urlencode, urlparse
+
+from authlib.jose import JsonWebKey, jwt
+
+from .config import AuthConfig
+
+JWKS_PATH = "/.well-known/jwks.json"
+TOKEN_PATH = "/oauth2/token"
+LOGIN_PATH = "/login"
+LOGOUT_PATH = "/logout"
+
+
+def generate_rsa_key(kid: str) -> Tuple[Any, Dict[str, Any]]:
+    private_key = JsonWebKey.generate_key("RSA", 2048, is_private=True)
+    public_jwk = {
+        name: value
+        for name, value in private_key.as_dict().items()
+        if name in ("kty", "n", "e")
+    }
+    public_jwk.update({"kid": kid, "alg": "RS256", "use": "sig"})
+    return private_key, public_jwk
+
+
+def sign_token(private_key: Any, kid: str, claims: Dict[str, Any]) -> str:
+    claims = {name: value for name, value in claims.items() if value is not None}
+    return jwt.encode({"alg": "RS256", "kid": kid}, claims, private_key).decode()
+
+
+class FakeCognito:
+    def __init__(
+        self,
+        client_id: str = "test-client-id",
+        client_secret: str = "test-client-secret",
+        username: str = "test-user",
+        groups: Optional[List[str]] = None,
+        expires_in: int = 3600,
+        latency: float = 0.0,
+        cache_control: str = "public, max-age=3600",
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.username = username
+        self.groups = groups or []
+        self.expires_in = expires_in
+        self.latency = latency
+        self.cache_control = cache_control
+        self.requests: Counter = Counter()
+        self._address = (host, port)
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._key_count = 0
+        self._keys: List[Tuple[Any, Dict[str, Any]]] = []
+        self._codes: Dict[str, Tuple[str, List[str]]] = {}
+        self._refresh_tokens: Dict[str, Tuple[str, List[str]]] = {}
+        self._errors: Dict[str, List[int]] = {}
+        self.rotate_keys()
+
+    @property
+    def url(self) -> str:
+        if self._server is None:
+            raise RuntimeError("FakeCognito is not running")
+        return f"http://{self._address[0]}:{self._server.server_port}"
+
+    def config(self, callback_url: str, **kwargs: Any) -> AuthConfig:
+        return AuthConfig(
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            callback_url=callback_url,
+            cognito_domain=self.url,
+            cognito_endpoint=self.url,
+            **kwargs,
+        )
+
+    def start(self) -> "FakeCognito":
+        if self._server is None:
+            self._server = ThreadingHTTPServer(self._address, self._handler())
+            self._server.daemon_threads = True
+            self._thread = threading.Thread(
+                target=self._server.serve_forever, daemon=True
+            )
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+
+    def __enter__(self) -> "FakeCognito":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
+
+    def jwks(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"keys": [public_jwk for _, public_jwk in self._keys]}
+
+    def rotate_keys(self, keep_previous: bool = True) -> str:
+        kid = f"fake-kid-{self._key_count}"
+        private_key, public_jwk = generate_rsa_key(kid)
+        with self._lock:
+            self._key_count += 1
+            previous = self._keys[:1] if keep_previous else []
+            self._keys = [(private_key, public_jwk)] + previous
+        return kid
+
+    def inject_error(self, path: str, status: int = 500, count: int = 1) -> None:
+        with self._lock:
+            self._errors.setdefault(path, []).extend([status] * count)
+
+    def issue_code(
+        self, username: Optional[str] = None, groups: Optional[List[str]] = None
+    ) -> str:
+        code = secrets.token_urlsafe(16)
+        with self._lock:
+            self._codes[code] = (
+                username or self.username,
+                self.groups if groups is None else groups,
+            )
+        return code
+
+    def sign_token(
+        self,
+        username: Optional[str] = None,
+        groups: Optional[List[str]] = None,
+        expires_in: Optional[int] = None,
+        **claims: Any,
+    ) -> str:
+        now = int(time.time())
+        payload = {
+            "iss": self.url,
+            "client_id": self.client_id,
+            "token_use": "access",
+            "username": username or self.username,
+            "cognito:groups": self.groups if groups is None else groups,
+            "iat": now,
+            "exp": now + (self.expires_in if expires_in is None else expires_in),
+            "jti": secrets.token_hex(8),
+            **claims,
+        }
+        with self._lock:
+            private_key, public_jwk = self._keys[0]
+        return sign_token(private_key, public_jwk["kid"], payload)
+
+    def _token_response(
+        self, grant_type: str, form: Dict[str, str]
+    ) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            if grant_type == "authorization_code":
+                user = self._codes.pop(form.get("code", ""), None)
+            elif grant_type == "refresh_token":
+                user = self._refresh_tokens.get(form.get("refresh_token", ""))
+            else:
+                return 400, {"error": "unsupported_grant_type"}
+        if user is None:
+            return 400, {"error": "invalid_grant"}
+        username, groups = user
+        token: Dict[str, Any] = {
+            "access_token": self.sign_token(username, groups),
+            "expires_in": self.expires_in,
+            "token_type": "Bearer",
+        }
+        if grant_type == "authorization_code":
+            token["refresh_token"] = secrets.token_urlsafe(32)
+            with self._lock:
+                self._refresh_tokens[token["refresh_token"]] = user
+        return 200, token
+
+    def _client_authenticated(self, headers: Any, form: Dict[str, str]) -> bool:
+        client_id = form.get("client_id")
+        client_secret = form.get("client_secret")
+        authorization = headers.get("Authorization", "")
+        if authorization.startswith("Basic "):
+            credentials = base64.b64decode(authorization[6:]).decode("utf-8")
+            client_id, _, client_secret = credentials.partition(":")
+            client_id, client_secret = unquote(client_id), unquote(client_secret)
+        return client_id == self.client_id and client_secret == self.client_secret
+
+    def _injected_error(self, path: str) -> Optional[int]:
+        with self._lock:
+            errors = self._errors.get(path)
+            return errors.pop(0) if errors else None
+
+    def _handler(self) -> type:
+        cognito = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                self._handle("GET")
+
+            def do_HEAD(self) -> None:
+                self._handle("HEAD")
+
+            def do_POST(self) -> None:
+                self._handle("POST")
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _handle(self, method: str) -> None:
+                url = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length).decode("utf-8") if length else ""
+                cognito.requests[url.path] += 1
+                if cognito.latency:
+                    time.sleep(cognito.latency)
+                status = cognito._injected_error(url.path)
+                if status is not None:
+                    self._send_json(status, {"error": "injected_error"})
+                    return
+                query = dict(parse_qsl(url.query))
+                if method == "GET" and url.path == JWKS_PATH:
+                    self._send_json(
+                        200, cognito.jwks(), {"Cache-Control": cognito.cache_control}
+                    )
+                elif method == "POST" and url.path == TOKEN_PATH:
+                    form = dict(parse_qsl(body))
+                    if not cognito._client_authenticated(self.headers, form):
+                        self._send_json(401, {"error": "invalid_client"})
+                        return
+                    self._send_json(
+                        *cognito._token_response(form.get("grant_type", ""), form)
+                    )
+                elif method == "GET" and url.path == LOGIN_PATH:
+                    if "redirect_uri" not in query:
+                        self._send_json(400, {"error": "invalid_request"})
+                        return
+                    params = {"code": cognito.issue_code()}
+                    if "state" in query:
+                        params["state"] = query["state"]
+                    self._redirect(f"{query['redirect_uri']}?{urlencode(params)}")
+                elif method == "GET" and url.path == LOGOUT_PATH:
+                    self._redirect(f"{cognito.url}{LOGIN_PATH}?{url.query}")
+                else:
+                    self._send_json(404 if method != "HEAD" else 405, {})
+
+            def _send_json(
+                self,
+                status: int,
+                payload: Dict[str, Any],
+                headers: Optional[Dict[str, str]] = None,
+            ) -> None:
+                content = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if self.command != "HEAD":
+                    self.wfile.write(content)
+
+            def _redirect(self, location: str) -> None:
+                self.send_response(302)
+                self.send_header("Location", location)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+        return Handler
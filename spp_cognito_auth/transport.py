@@ -0,0 +1,88 @@
+import os
+from threading import Lock
+from typing import Any, Dict, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .config import AuthConfig
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_adapters: Dict[Tuple[Any, ...], "PooledHTTPAdapter"] = {}
+_adapters_lock = Lock()
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    __attrs__ = HTTPAdapter.__attrs__ + ["timeout"]
+
+    def __init__(self, timeout: Tuple[float, float], **kwargs: Any) -> None:
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def send(  # type: ignore
+        self, request: requests.PreparedRequest, timeout: Any = None, **kwargs: Any
+    ) -> requests.Response:
+        if timeout is None:
+            timeout = self.timeout
+        return super().send(request, timeout=timeout, **kwargs)
+
+    def stats(self) -> Dict[str, int]:
+        connections = 0
+        requests_sent = 0
+        for pool_key in self.poolmanager.pools.keys():
+            pool = self.poolmanager.pools.get(pool_key)
+            if pool is None:
+                continue
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+        return {"connections": connections, "requests": requests_sent}
+
+
+def http_adapter(config: AuthConfig) -> PooledHTTPAdapter:
+    key = (
+        config.http_pool_size,
+        config.http_connect_timeout,
+        config.http_read_timeout,
+        config.http_retries,
+        config.http_backoff_factor,
+    )
+    with _adapters_lock:
+        adapter = _adapters.get(key)
+        if adapter is None:
+            adapter = _adapters[key] = PooledHTTPAdapter(
+                timeout=(config.http_connect_timeout, config.http_read_timeout),
+                pool_connections=config.http_pool_size,
+                pool_maxsize=config.http_pool_size,
+                max_retries=Retry(
+                    total=config.http_retries,
+                    backoff_factor=config.http_backoff_factor,
+                    status_forcelist=RETRY_STATUSES,
+                    allowed_methods=frozenset(["GET"]),
+                    raise_on_status=False,
+                ),
+            )
+        return adapter
+
+
+def _reset_adapters_after_fork() -> None:
+    global _adapters_lock
+    _adapters_lock = Lock()
+    for adapter in _adapters.values():
+        adapter.poolmanager.clear()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_adapters_after_fork)
+
+
+def mount_http_adapter(http: requests.Session, config: AuthConfig) -> requests.Session:
+    adapter = http_adapter(config)
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+def new_http_session(config: AuthConfig) -> requests.Session:
+    return mount_http_adapter(requests.Session(), config)
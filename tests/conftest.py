@@ -3,7 +3,14 @@ from unittest import mock
 import pytest
 from flask import Flask
 
-from spp_cognito_auth import Auth, AuthConfig, requires_auth, requires_role
+from spp_cognito_auth import (
+    Auth,
+    AuthConfig,
+    requires_auth,
+    requires_bearer_auth,
+    requires_role,
+)
+from spp_cognito_auth.testing import generate_rsa_key
 
 
 @pytest.fixture
@@ -43,6 +50,11 @@ def jwks():
     }
 
 
+@pytest.fixture(scope="session")
+def rsa_key():
+    return generate_rsa_key("test-kid")
+
+
 @pytest.fixture
 def session():
     return {}
@@ -65,6 +77,12 @@ def flask_app(auth):
     def test_roles():
         return "Welcome to the Role endpoint!"
 
+    @app.route("/api")
+    @requires_bearer_auth
+    @requires_role(["survey.main.read"])
+    def api():
+        return "Welcome to the API!"
+
     with app.app_context():
         yield app
 
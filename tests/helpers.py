@@ -1,5 +1,8 @@
+import time
 from uuid import UUID
 
+from spp_cognito_auth import testing
+
 
 def is_valid_uuid(uuid_to_test):
     try:
@@ -8,3 +11,43 @@ def is_valid_uuid(uuid_to_test):
     except ValueError:
         return False
     return str(uuid) == uuid_to_test
+
+
+def sign_token(private_key, kid, claims):
+    return testing.sign_token(
+        private_key,
+        kid,
+        {
+            "iss": "https://test-cognito-endpoint.test.com",
+            "client_id": "test-client-id",
+            "token_use": "access",
+            **claims,
+        },
+    )
+
+
+def invalid_token(kind, private_key, kid):
+    if kind == "malformed":
+        return "not-a-token"
+    claims = {"username": "test-user", "exp": int(time.time()) + 3600}
+    if kind == "forged":
+        return sign_token(testing.generate_rsa_key(kid)[0], kid, claims)
+    return sign_token(private_key, "unknown-kid", claims)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.expiry = {}
+
+    def get(self, key):
+        value = self.data.get(key)
+        return value.encode("utf-8") if value is not None else None
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+        self.expiry[key] = ex
+
+    def delete(self, key):
+        self.data.pop(key, None)
+        self.expiry.pop(key, None)
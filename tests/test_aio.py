@@ -0,0 +1,386 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+import pytest
+from authlib.integrations.base_client import OAuthError
+from authlib.jose.errors import ExpiredTokenError
+from authlib.oauth2.rfc6749 import OAuth2Token
+from helpers import invalid_token, sign_token
+
+from spp_cognito_auth import CallbackMetrics, MemoryStore
+
+quart = pytest.importorskip("quart")
+respx = pytest.importorskip("respx")
+
+from spp_cognito_auth.aio import (  # noqa: E402
+    AsyncAuth,
+    AsyncAuthBlueprint,
+    new_async_oauth_client,
+    requires_auth,
+    requires_bearer_auth,
+    requires_role,
+)
+
+
+@pytest.fixture
+def oauth():
+    oauth = mock.MagicMock()
+    oauth.fetch_token = mock.AsyncMock()
+    oauth.refresh_token = mock.AsyncMock()
+    return oauth
+
+
+@pytest.fixture
+def async_auth(config, oauth, session):
+    return AsyncAuth(config, oauth, session)
+
+
+@pytest.fixture
+def signed_token(rsa_key):
+    private_key, public_jwk = rsa_key
+
+    def sign(**claims):
+        claims.setdefault("username", "test-user")
+        claims.setdefault("exp", int(time.time()) + 3600)
+        return sign_token(private_key, public_jwk["kid"], claims)
+
+    return sign
+
+
+@pytest.fixture
+def mock_jwks(async_auth, rsa_key):
+    with respx.mock:
+        yield respx.get(async_auth.public_key_url()).respond(
+            json={"keys": [rsa_key[1]]},
+            headers={"cache-control": "public, max-age=3600"},
+        )
+
+
+@pytest.fixture
+def quart_app(async_auth):
+    app = quart.Quart(__name__)
+    app.auth = async_auth
+
+    @app.route("/")
+    @requires_auth
+    async def root():
+        return "Hello, World!"
+
+    @app.route("/test-roles")
+    @requires_auth
+    @requires_role(["survey.main.read", "survey.main.write"])
+    async def test_roles():
+        return "Welcome to the Role endpoint!"
+
+    @app.route("/api")
+    @requires_bearer_auth
+    @requires_role(["survey.main.read"])
+    async def api():
+        return "Welcome to the API!"
+
+    return app
+
+
+def test_new_async_oauth_client(config):
+    oauth = new_async_oauth_client(config)
+    assert oauth.client_id == "test-client-id"
+    assert oauth.redirect_uri == "http://test-app-host.test.com/auth/callback"
+    assert oauth.timeout.connect == config.http_connect_timeout
+
+
+def test_decode_token(async_auth, signed_token, mock_jwks):
+    token = signed_token()
+    claims = asyncio.run(async_auth.decode_token(token))
+    assert claims["username"] == "test-user"
+    assert asyncio.run(async_auth.decode_token(token)) is claims
+    assert async_auth.token_cache_stats()["hits"] == 1
+    assert mock_jwks.call_count == 1
+
+
+def test_get_public_keys_single_flight(async_auth, signed_token, mock_jwks):
+    tokens = [signed_token(jti=str(i)) for i in range(5)]
+
+    async def decode_all():
+        return await asyncio.gather(*map(async_auth.decode_token, tokens))
+
+    assert len(asyncio.run(decode_all())) == 5
+    assert mock_jwks.call_count == 1
+    assert async_auth._jwks_expires_at > datetime.now() + timedelta(minutes=59)
+
+
+def test_get_public_keys_stale_if_error(async_auth, rsa_key):
+    async_auth._jwks_token = {"keys": [rsa_key[1]]}
+    async_auth._jwks_expires_at = datetime.now() - timedelta(hours=1)
+    async_auth._jwks_stale_until = datetime.now() + timedelta(hours=1)
+    with respx.mock:
+        route = respx.get(async_auth.public_key_url()).respond(status_code=500)
+        assert asyncio.run(async_auth.get_public_keys()) == {"keys": [rsa_key[1]]}
+    assert route.call_count == 1
+    assert async_auth._jwks_expires_at > datetime.now()
+
+
+def test_get_public_key_unknown_kid(async_auth, mock_jwks):
+    with pytest.raises(ValueError):
+        asyncio.run(async_auth.get_public_key("unknown-kid"))
+    assert mock_jwks.call_count == 1
+
+
+def test_get_public_key_unknown_kid_rate_limited_on_error(async_auth, rsa_key):
+    async_auth._jwks_token = {"keys": [rsa_key[1]]}
+    async_auth._jwks_expires_at = datetime.now() + timedelta(hours=1)
+    async_auth._jwks_stale_until = datetime.now() + timedelta(hours=2)
+
+    async def lookup_all():
+        for _ in range(5):
+            with pytest.raises(ValueError):
+                await async_auth.get_public_key("unknown-kid")
+
+    with respx.mock:
+        route = respx.get(async_auth.public_key_url()).respond(status_code=500)
+        asyncio.run(lookup_all())
+    assert route.call_count == 1
+
+
+def test_process_callback(async_auth, oauth, signed_token, mock_jwks):
+    token = signed_token(**{"cognito:groups": ["survey.main.read"]})
+    oauth.fetch_token.return_value = OAuth2Token(
+        {"access_token": token, "refresh_token": "my-refresh-token", "expires_in": 60}
+    )
+    asyncio.run(async_auth.process_callback("mock-auth-code"))
+    oauth.fetch_token.assert_awaited_once_with(
+        "https://test-cognito-domain.test.com/oauth2/token",
+        grant_type="authorization_code",
+        code="mock-auth-code",
+        authorization_response="http://test-app-host.test.com/auth/callback",
+    )
+    assert async_auth.get_username() == "test-user"
+    assert async_auth.get_roles() == ["survey.main.read"]
+    assert async_auth._session["refresh_token"] == "my-refresh-token"
+
+
+class BlockingStore(MemoryStore):
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+    def delete(self, key):
+        self.threads.append(threading.get_ident())
+        super().delete(key)
+
+
+def test_blocking_stores_run_off_the_event_loop(
+    config, oauth, session, signed_token, mock_jwks
+):
+    store = BlockingStore()
+    cache = BlockingStore()
+    async_auth = AsyncAuth(config, oauth, session, store=store, cache=cache)
+    cache.threads.clear()
+    token = signed_token(**{"cognito:groups": ["survey.main.read"]})
+    oauth.fetch_token.return_value = OAuth2Token(
+        {"access_token": token, "refresh_token": "my-refresh-token", "expires_in": 3600}
+    )
+
+    async def login():
+        await async_auth.process_callback("mock-auth-code")
+        assert await async_auth.logged_in()
+        assert async_auth.get_roles() == ["survey.main.read"]
+        await async_auth.logout()
+
+    asyncio.run(login())
+    assert store.threads and cache.threads
+    assert threading.get_ident() not in store.threads + cache.threads
+    assert len(store) == 0
+    assert session == {}
+
+
+def test_logged_in_refreshes_once_per_refresh_token(
+    async_auth, oauth, signed_token, mock_jwks
+):
+    async def slow_refresh(*args, **kwargs):
+        await asyncio.sleep(0.01)
+        return OAuth2Token({"access_token": signed_token(), "expires_in": 3600})
+
+    oauth.refresh_token.side_effect = slow_refresh
+    async_auth._session.update(
+        {
+            "access_token": signed_token(),
+            "refresh_token": "my-refresh-token",
+            "expires_at": time.time() + 30,
+        }
+    )
+
+    async def check_all():
+        return await asyncio.gather(*(async_auth.logged_in() for _ in range(5)))
+
+    assert asyncio.run(check_all()) == [True] * 5
+    oauth.refresh_token.assert_awaited_once_with(
+        "https://test-cognito-domain.test.com/oauth2/token",
+        refresh_token="my-refresh-token",
+    )
+    assert async_auth._session["refresh_token"] == "my-refresh-token"
+
+
+def test_refresh_access_token_failure(async_auth, oauth):
+    oauth.refresh_token.side_effect = OAuthError("invalid_grant")
+    async_auth._session.update(
+        {"access_token": "old-token", "refresh_token": "my-refresh-token"}
+    )
+    assert asyncio.run(async_auth.refresh_access_token()) is False
+    assert async_auth._session["access_token"] == "old-token"
+
+
+@pytest.mark.parametrize("kind", ["forged", "malformed", "unknown-kid"])
+def test_logged_in_invalid_token(async_auth, rsa_key, mock_jwks, kind):
+    private_key, public_jwk = rsa_key
+    async_auth._session["access_token"] = invalid_token(
+        kind, private_key, public_jwk["kid"]
+    )
+    assert asyncio.run(async_auth.logged_in()) is False
+
+
+def test_get_principal_logged_out(async_auth):
+    assert asyncio.run(async_auth.get_principal()) is None
+
+
+def test_requires_auth_redirects(quart_app):
+    async def get():
+        return await quart_app.test_client().get("/")
+
+    response = asyncio.run(get())
+    assert response.status_code == 302
+    assert response.headers["Location"].startswith(
+        "https://test-cognito-domain.test.com/login?"
+    )
+    assert quart_app.auth.get_redirect() == "http://localhost/"
+
+
+def test_requires_auth_fetch_unauthorized(quart_app):
+    async def get():
+        return await quart_app.test_client().get(
+            "/", headers={"Sec-Fetch-Mode": "cors"}
+        )
+
+    response = asyncio.run(get())
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == 'Session realm="login"'
+    assert "Location" not in response.headers
+    assert quart_app.auth._session == {}
+
+
+def test_requires_role(quart_app, signed_token, mock_jwks):
+    quart_app.auth._session.update(
+        {"access_token": signed_token(), "roles": ["survey.main.read"]}
+    )
+
+    async def get(path):
+        response = await quart_app.test_client().get(path)
+        return response.status_code, await response.get_data(as_text=True)
+
+    assert asyncio.run(get("/test-roles")) == (200, "Welcome to the Role endpoint!")
+    quart_app.auth._session["roles"] = ["survey.other.read"]
+    assert asyncio.run(get("/test-roles"))[0] == 403
+
+
+@mock.patch.object(AsyncAuth, "process_callback")
+def test_auth_blueprint_callback(mock_process_callback, quart_app):
+    quart_app.register_blueprint(AsyncAuthBlueprint().blueprint())
+    quart_app.auth._session["state"] = "fake-state-uuid"
+
+    async def get():
+        return await quart_app.test_client().get(
+            "/auth/callback?code=mock-auth-code&state=fake-state-uuid"
+        )
+
+    response = asyncio.run(get())
+    mock_process_callback.assert_awaited_once_with("mock-auth-code")
+    assert response.status_code == 302
+    assert response.headers["Location"] == "/"
+
+
+def test_auth_blueprint_logout(quart_app):
+    quart_app.register_blueprint(AsyncAuthBlueprint().blueprint())
+    quart_app.auth._session["access_token"] = "my-token"
+
+    async def get():
+        return await quart_app.test_client().get("/auth/logout")
+
+    response = asyncio.run(get())
+    assert response.status_code == 302
+    assert response.headers["Location"].startswith(
+        "https://test-cognito-domain.test.com/logout?"
+    )
+    assert quart_app.auth._session == {"state": mock.ANY}
+
+
+def test_requires_bearer_auth(quart_app, signed_token, mock_jwks):
+    token = signed_token(**{"cognito:groups": ["survey.main.read"]})
+
+    async def get(headers):
+        return await quart_app.test_client().get("/api", headers=headers)
+
+    assert asyncio.run(get({"Authorization": f"Bearer {token}"})).status_code == 200
+    response = asyncio.run(get({"Authorization": "Bearer not-a-token"}))
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == 'Bearer error="invalid_token"'
+    assert asyncio.run(get({})).headers["WWW-Authenticate"] == "Bearer"
+    assert quart_app.auth._session == {}
+
+
+def test_validate_many(async_auth, signed_token, mock_jwks):
+    valid = signed_token()
+    expired = signed_token(exp=int(time.time()) - 60)
+    results = asyncio.run(async_auth.validate_many([valid, expired, valid]))
+    assert results[0]["username"] == "test-user"
+    assert isinstance(results[1], ExpiredTokenError)
+    assert results[2] is results[0]
+    assert mock_jwks.call_count == 1
+
+
+def test_metrics(config, oauth, session, signed_token, mock_jwks):
+    events = []
+    async_auth = AsyncAuth(
+        config,
+        oauth,
+        session,
+        metrics=CallbackMetrics(lambda *event: events.append(event)),
+    )
+    asyncio.run(async_auth.decode_token(signed_token()))
+    operations = [
+        labels["operation"] for name, _, labels in events if name == "latency"
+    ]
+    assert {"get_public_keys", "jwks_fetch", "token_verify"} <= set(operations)
+
+
+def test_warm_up(quart_app, async_auth, oauth, mock_jwks):
+    oauth.request = mock.AsyncMock()
+    quart_app.register_blueprint(AsyncAuthBlueprint().blueprint())
+
+    async def health():
+        response = await quart_app.test_client().get("/auth/health")
+        return response.status_code, await response.get_json()
+
+    assert asyncio.run(health())[0] == 503
+    with respx.mock:
+        route = respx.head(async_auth.public_key_url()).respond()
+        assert asyncio.run(async_auth.warm_up())["status"] == "ok"
+    assert route.call_count == 1
+    oauth.request.assert_awaited_once_with(
+        "HEAD", async_auth.token_url(), withhold_token=True
+    )
+    status, health = asyncio.run(health())
+    assert status == 200
+    assert health["keys"] == 1
+    assert health["last_fetch_latency"] >= 0
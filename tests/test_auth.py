@@ -1,14 +1,24 @@
+import threading
 from datetime import datetime, timedelta
 from unittest import mock
 
 import pytest
-from authlib.jose.errors import ExpiredTokenError
+import requests
+from authlib.integrations.base_client import OAuthError
+from authlib.jose import JWTClaims
+from authlib.jose.errors import DecodeError, ExpiredTokenError, JoseError
 from authlib.oauth2.rfc6749 import OAuth2Token
+from authlib.oauth2.rfc7636 import create_s256_code_challenge
 from freezegun import freeze_time
-from helpers import is_valid_uuid
+from helpers import is_valid_uuid, sign_token
 
 import spp_cognito_auth
-from spp_cognito_auth import new_oauth_client
+from spp_cognito_auth import Auth, MemoryStore, Principal, all_of, new_oauth_client
+from spp_cognito_auth.cache import roles_digest
+from spp_cognito_auth.claims import CognitoClaims
+from spp_cognito_auth.jwks import JWKSSnapshot, load_jwks_snapshot, save_jwks_snapshot
+from spp_cognito_auth.testing import generate_rsa_key
+from spp_cognito_auth.transport import http_adapter
 
 
 class TestAuth:
@@ -20,7 +30,7 @@ class TestAuth:
             + "client_id=test-client-id&"
             + "response_type=code&"
             + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-            + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+            + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
             + "state=my-random-uuid"
         )
 
@@ -32,10 +42,45 @@ class TestAuth:
             + "client_id=test-client-id&"
             + "response_type=code&"
             + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-            + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+            + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
             + "state=my-random-uuid"
         )
 
+    @mock.patch.object(spp_cognito_auth.Auth, "generate_state")
+    def test_login_url_pkce(self, mock_generate_state, config, oauth, session):
+        mock_generate_state.return_value = "my-random-uuid"
+        config.pkce = True
+        auth = Auth(config, oauth, session)
+        url, code_challenge = auth.login_url().split("&code_challenge=")
+        assert url.endswith("&state=my-random-uuid")
+        assert code_challenge == (
+            create_s256_code_challenge(session["code_verifier"])
+            + "&code_challenge_method=S256"
+        )
+
+    def test_get_auth_token_pkce(self, config, oauth, session):
+        config.pkce = True
+        auth = Auth(config, oauth, session)
+        auth.login_url()
+        code_verifier = session["code_verifier"]
+        auth.get_auth_token("fake-auth-code")
+        oauth.fetch_token.assert_called_once_with(
+            "https://test-cognito-domain.test.com/oauth2/token",
+            grant_type="authorization_code",
+            code="fake-auth-code",
+            authorization_response="http://test-app-host.test.com/auth/callback",
+            code_verifier=code_verifier,
+        )
+        assert "code_verifier" not in session
+
+    def test_login_url_encodes_callback_url(self, config, oauth, session):
+        config.callback_url = "http://test-app-host.test.com/auth/callback?a=b c"
+        auth = Auth(config, oauth, session)
+        assert (
+            "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback"
+            + "%3Fa%3Db+c&state="
+        ) in auth.login_url()
+
     def test_public_key_url(self, auth):
         assert (
             auth.public_key_url()
@@ -93,58 +138,250 @@ class TestAuth:
         assert auth.get_public_keys() == jwks
         assert auth._jwks_expires_at.isoformat() == "2020-11-13T01:00:00"
 
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_min_ttl(self, auth, jwks, requests_mock):
+        requests_mock.get(auth.public_key_url(), json=jwks)
+        assert auth.get_public_keys() == jwks
+        assert auth._jwks_expires_at.isoformat() == "2020-11-13T00:05:00"
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_max_ttl(self, auth, jwks, requests_mock):
+        requests_mock.get(
+            auth.public_key_url(),
+            json=jwks,
+            headers={"cache-control": "public, max-age=31536000"},
+        )
+        assert auth.get_public_keys() == jwks
+        assert auth._jwks_expires_at.isoformat() == "2020-11-14T00:00:00"
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_stale_while_revalidate(self, auth, jwks, requests_mock):
+        release = threading.Event()
+
+        def slow_jwks(request, context):
+            release.wait(5)
+            return jwks
+
+        requests_mock.get(
+            auth.public_key_url(),
+            json=slow_jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        auth._jwks_token = {"keys": []}
+        auth._jwks_expires_at = datetime.now() - timedelta(seconds=30)
+        assert auth.get_public_keys() == {"keys": []}
+        release.set()
+        auth._jwks_refresh_thread.join(5)
+        assert auth.get_public_keys() == jwks
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_stale_if_error(self, auth, jwks, requests_mock):
+        requests_mock.get(auth.public_key_url(), status_code=500)
+        auth._jwks_token = jwks
+        auth._jwks_expires_at = datetime(2020, 11, 12)
+        auth._jwks_stale_until = datetime(2020, 11, 14)
+        assert auth.get_public_keys() == jwks
+        assert auth._jwks_expires_at.isoformat() == "2020-11-13T00:00:30"
+
+    def test_get_public_keys_stale_if_error_retry_spaced(
+        self, auth, jwks, requests_mock
+    ):
+        requests_mock.get(auth.public_key_url(), status_code=500)
+        auth._jwks_token = jwks
+        auth._jwks_expires_at = datetime(2020, 11, 12)
+        auth._jwks_stale_until = datetime(2020, 11, 14)
+        with freeze_time("2020-11-13") as frozen:
+            for _ in range(50):
+                assert auth.get_public_keys() == jwks
+            assert requests_mock.call_count == 1
+            assert auth.health()["next_refresh_in"] == 30
+            frozen.tick(31)
+            assert auth.get_public_keys() == jwks
+            auth._jwks_refresh_thread.join(5)
+        assert requests_mock.call_count == 2
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_stale_if_error_exceeded(self, auth, jwks, requests_mock):
+        requests_mock.get(auth.public_key_url(), status_code=500)
+        auth._jwks_token = jwks
+        auth._jwks_expires_at = datetime(2020, 11, 11)
+        auth._jwks_stale_until = datetime(2020, 11, 12)
+        with pytest.raises(requests.HTTPError):
+            auth.get_public_keys()
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_error_no_keys(self, auth, requests_mock):
+        requests_mock.get(auth.public_key_url(), exc=requests.exceptions.ConnectTimeout)
+        with pytest.raises(requests.exceptions.ConnectTimeout):
+            auth.get_public_keys()
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_writes_snapshot(
+        self, config, oauth, session, jwks, requests_mock, tmp_path
+    ):
+        config.jwks_cache_path = str(tmp_path / "jwks.json")
+        requests_mock.get(
+            "https://test-cognito-endpoint.test.com/.well-known/jwks.json",
+            json=jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        Auth(config, oauth, session).get_public_keys()
+        snapshot = load_jwks_snapshot(config.jwks_cache_path)
+        assert snapshot.jwks == jwks
+        assert snapshot.expires_at.isoformat() == "2020-11-14T00:00:00"
+
+    @freeze_time("2020-11-13")
+    def test_init_loads_snapshot(self, config, oauth, session, rsa_key, tmp_path):
+        _, public_jwk = rsa_key
+        config.jwks_cache_path = str(tmp_path / "jwks.json")
+        save_jwks_snapshot(
+            config.jwks_cache_path,
+            JWKSSnapshot(
+                jwks={"keys": [public_jwk]},
+                expires_at=datetime(2020, 11, 14),
+                stale_until=datetime(2020, 11, 15),
+            ),
+        )
+        auth = Auth(config, oauth, session)
+        assert auth.get_public_keys() == {"keys": [public_jwk]}
+        assert list(auth._jwks_keys) == [public_jwk["kid"]]
+
+    @freeze_time("2020-11-13")
+    def test_init_ignores_expired_snapshot(
+        self, config, oauth, session, jwks, tmp_path
+    ):
+        config.jwks_cache_path = str(tmp_path / "jwks.json")
+        save_jwks_snapshot(
+            config.jwks_cache_path,
+            JWKSSnapshot(
+                jwks=jwks,
+                expires_at=datetime(2020, 11, 12),
+                stale_until=datetime(2020, 11, 13),
+            ),
+        )
+        assert Auth(config, oauth, session)._jwks_token is None
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_single_flight(self, auth, jwks, requests_mock):
+        fetching = threading.Event()
+        release = threading.Event()
+
+        def slow_jwks(request, context):
+            fetching.set()
+            release.wait(5)
+            return jwks
+
+        requests_mock.get(
+            auth.public_key_url(),
+            json=slow_jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        auth._jwks_token = {"keys": []}
+        auth._jwks_expires_at = datetime(1970, 1, 1)
+        refresh = threading.Thread(target=auth.get_public_keys)
+        refresh.start()
+        fetching.wait(5)
+        assert auth.get_public_keys() == {"keys": []}
+        release.set()
+        refresh.join(5)
+        assert auth.get_public_keys() == jwks
+        assert requests_mock.call_count == 1
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_single_flight_waits_without_keys(
+        self, auth, jwks, requests_mock
+    ):
+        requests_mock.get(
+            auth.public_key_url(),
+            json=jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        with auth._jwks_lock:
+            waiting = threading.Thread(target=auth.get_public_keys)
+            waiting.start()
+            auth._fetch_public_keys()
+        waiting.join(5)
+        assert requests_mock.call_count == 1
+
+    @freeze_time("2020-11-13")
+    def test_get_public_keys_refresh_ahead(self, auth, jwks, requests_mock):
+        release = threading.Event()
+
+        def slow_jwks(request, context):
+            release.wait(5)
+            return jwks
+
+        requests_mock.get(
+            auth.public_key_url(),
+            json=slow_jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        auth._jwks_token = {"keys": []}
+        auth._jwks_expires_at = datetime.now() + timedelta(seconds=30)
+        assert auth.get_public_keys() == {"keys": []}
+        release.set()
+        auth._jwks_refresh_thread.join(5)
+        assert auth.get_public_keys() == jwks
+        assert auth._jwks_expires_at.isoformat() == "2020-11-14T00:00:00"
+        assert requests_mock.call_count == 1
+
     @mock.patch.object(spp_cognito_auth.Auth, "get_auth_token")
-    @mock.patch.object(spp_cognito_auth.Auth, "get_public_keys")
     @mock.patch("authlib.jose.jwt.decode")
-    def test_process_callback(
-        self, mock_jwt_decode, mock_get_public_keys, mock_get_auth_token, auth, jwks
-    ):
+    def test_process_callback(self, mock_jwt_decode, mock_get_auth_token, auth):
         mock_get_auth_token.return_value = {
             "access_token": "mock-access-token",
             "refresh_token": "mock-refresh-token",
             "expires_at": "mock-expires-at",
         }
-        mock_jwt_decode.return_value = {
-            "username": "mock-user",
-            "cognito:groups": ["survey.main.read", "survey.main.write"],
-        }
-        mock_get_public_keys.return_value = jwks
+        mock_jwt_decode.return_value = JWTClaims(
+            {
+                "username": "mock-user",
+                "cognito:groups": ["survey.main.read", "survey.main.write"],
+            },
+            {},
+        )
         auth._session = {}
         auth.process_callback("fake-auth-code")
         mock_get_auth_token.assert_called_once_with("fake-auth-code")
-        mock_jwt_decode.assert_called_once_with("mock-access-token", jwks)
-        mock_get_public_keys.assert_called_once()
+        mock_jwt_decode.assert_called_once_with(
+            "mock-access-token",
+            auth._load_key,
+            claims_cls=CognitoClaims,
+            claims_options=auth._claims_options,
+        )
         assert auth._session["access_token"] == "mock-access-token"
         assert auth._session["refresh_token"] == "mock-refresh-token"
         assert auth._session["expires_at"] == "mock-expires-at"
         assert auth._session["username"] == "mock-user"
-        assert auth._session["roles"] == ["survey.main.read", "survey.main.write"]
+        assert auth._session["roles"] == "1:0survey.main.read,cwrite"
+        assert auth.get_roles() == ["survey.main.read", "survey.main.write"]
 
     @mock.patch.object(spp_cognito_auth.Auth, "get_auth_token")
-    @mock.patch.object(spp_cognito_auth.Auth, "get_public_keys")
     @mock.patch("authlib.jose.jwt.decode")
     def test_process_callback_no_groups(
-        self, mock_jwt_decode, mock_get_public_keys, mock_get_auth_token, auth, jwks
+        self, mock_jwt_decode, mock_get_auth_token, auth
     ):
         mock_get_auth_token.return_value = {
             "access_token": "mock-access-token",
             "refresh_token": "mock-refresh-token",
             "expires_at": "mock-expires-at",
         }
-        mock_jwt_decode.return_value = {
-            "username": "mock-user",
-        }
-        mock_get_public_keys.return_value = jwks
+        mock_jwt_decode.return_value = JWTClaims({"username": "mock-user"}, {})
         auth._session = {}
         auth.process_callback("fake-auth-code")
         mock_get_auth_token.assert_called_once_with("fake-auth-code")
-        mock_jwt_decode.assert_called_once_with("mock-access-token", jwks)
-        mock_get_public_keys.assert_called_once()
+        mock_jwt_decode.assert_called_once_with(
+            "mock-access-token",
+            auth._load_key,
+            claims_cls=CognitoClaims,
+            claims_options=auth._claims_options,
+        )
         assert auth._session["access_token"] == "mock-access-token"
         assert auth._session["refresh_token"] == "mock-refresh-token"
         assert auth._session["expires_at"] == "mock-expires-at"
         assert auth._session["username"] == "mock-user"
-        assert auth._session["roles"] == []
+        assert auth._session["roles"] == "1:"
+        assert auth.get_roles() == []
 
     def test_get_username(self, auth):
         auth._session = {"username": "test-user"}
@@ -162,6 +399,11 @@ class TestAuth:
         auth._session = {}
         assert auth.get_roles() == []
 
+    def test_get_roles_encoded(self, auth):
+        auth._session = {"roles": "1:0survey.main.read,cwrite"}
+        assert auth.get_roles() == ["survey.main.read", "survey.main.write"]
+        assert auth.match_role("survey.*.write") is True
+
     def test_get_redirect(self, auth):
         auth._session = {"redirect_url": "/foobar"}
         assert auth.get_redirect() == "/foobar"
@@ -181,6 +423,201 @@ class TestAuth:
         auth._session = {"access_token": "my-token"}
         assert auth.logged_in() is True
 
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_get_principal(self, mock_jwt_decode, auth):
+        expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+        mock_jwt_decode.return_value = JWTClaims(
+            {"username": "test-user", "exp": expires_at}, {}
+        )
+        auth._session = {
+            "access_token": "my-token",
+            "username": "test-user",
+            "roles": ["survey.main.read"],
+        }
+        principal = auth.get_principal()
+        assert principal.username == "test-user"
+        assert principal.roles == ("survey.main.read",)
+        assert principal.claims == {"username": "test-user", "exp": expires_at}
+        assert principal.expires_at == expires_at
+        mock_jwt_decode.assert_called_once()
+
+    def test_get_principal_logged_out(self, auth):
+        auth._session = {}
+        assert auth.get_principal() is None
+
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_logged_in_refreshes_expiring_token(self, mock_jwt_decode, auth, oauth):
+        now = datetime.now().timestamp()
+        mock_jwt_decode.return_value = JWTClaims(
+            {"username": "test-user", "exp": now + 3600}, {}
+        )
+        oauth.refresh_token.return_value = OAuth2Token(
+            {"access_token": "new-token", "expires_in": 3600, "expires_at": now + 3600}
+        )
+        auth._session = {
+            "access_token": "old-token",
+            "refresh_token": "my-refresh-token",
+            "expires_at": now + 30,
+        }
+        assert auth.logged_in() is True
+        oauth.refresh_token.assert_called_once_with(
+            "https://test-cognito-domain.test.com/oauth2/token",
+            refresh_token="my-refresh-token",
+        )
+        mock_jwt_decode.assert_called_once_with(
+            "new-token",
+            auth._load_key,
+            claims_cls=CognitoClaims,
+            claims_options=auth._claims_options,
+        )
+        assert auth._session["access_token"] == "new-token"
+        assert auth._session["refresh_token"] == "my-refresh-token"
+        assert auth._session["expires_at"] == now + 3600
+        assert auth._session["username"] == "test-user"
+
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_logged_in_does_not_refresh_fresh_token(self, mock_jwt_decode, auth, oauth):
+        now = datetime.now().timestamp()
+        auth._session = {
+            "access_token": "my-token",
+            "refresh_token": "my-refresh-token",
+            "expires_at": now + 3600,
+        }
+        assert auth.logged_in() is True
+        oauth.refresh_token.assert_not_called()
+
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_refresh_access_token_once_per_refresh_token(
+        self, mock_jwt_decode, config, oauth
+    ):
+        now = datetime.now().timestamp()
+        mock_jwt_decode.return_value = JWTClaims({"username": "test-user"}, {})
+        auth = Auth(config, oauth, {})
+        refreshing = threading.Event()
+        release = threading.Event()
+
+        def slow_refresh(*args, **kwargs):
+            refreshing.set()
+            release.wait(5)
+            return OAuth2Token(
+                {
+                    "access_token": "new-token",
+                    "expires_in": 3600,
+                    "expires_at": now + 3600,
+                }
+            )
+
+        oauth.refresh_token.side_effect = slow_refresh
+        auth._session = {"access_token": "old-token", "refresh_token": "my-token"}
+        threads = [threading.Thread(target=auth.refresh_access_token) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        refreshing.wait(5)
+        release.set()
+        for thread in threads:
+            thread.join(5)
+        auth._session = {"access_token": "old-token", "refresh_token": "my-token"}
+        assert auth.refresh_access_token() is True
+        oauth.refresh_token.assert_called_once()
+        assert auth._session["access_token"] == "new-token"
+
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_logged_in_refresh_failure(self, mock_jwt_decode, auth, oauth):
+        now = datetime.now().timestamp()
+        oauth.refresh_token.side_effect = OAuthError("invalid_grant")
+        mock_jwt_decode.return_value.validate.side_effect = ExpiredTokenError()
+        auth._session = {
+            "access_token": "old-token",
+            "refresh_token": "my-refresh-token",
+            "expires_at": now - 30,
+        }
+        assert auth.logged_in() is False
+        assert auth._session["access_token"] == "old-token"
+
+    def test_refresh_access_token_no_refresh_token(self, auth, oauth):
+        auth._session = {"access_token": "my-token"}
+        assert auth.refresh_access_token() is False
+        oauth.refresh_token.assert_not_called()
+
+    @freeze_time("2020-11-13")
+    @mock.patch.object(spp_cognito_auth.Auth, "get_auth_token")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_process_callback_with_store(
+        self, mock_jwt_decode, mock_get_auth_token, config, oauth
+    ):
+        now = datetime.now().timestamp()
+        mock_get_auth_token.return_value = {
+            "access_token": "mock-access-token",
+            "refresh_token": "mock-refresh-token",
+            "expires_at": now + 3600,
+        }
+        mock_jwt_decode.return_value = JWTClaims(
+            {"username": "mock-user", "cognito:groups": ["survey.main.read"]}, {}
+        )
+        store = MemoryStore()
+        session = {"sid": "old-sid"}
+        store.set("old-sid", {"username": "old-user"}, 60)
+        auth = Auth(config, oauth, session, store)
+        auth.process_callback("fake-auth-code")
+        assert list(session) == ["sid"]
+        assert session["sid"] != "old-sid"
+        assert store.get("old-sid") is None
+        assert store.get(session["sid"]) == {
+            "access_token": "mock-access-token",
+            "refresh_token": "mock-refresh-token",
+            "expires_at": now + 3600,
+            "username": "mock-user",
+            "roles": "1:0survey.main.read",
+            "roles_hash": roles_digest(["survey.main.read"]),
+            "refresh_expires_at": now + 2592000,
+        }
+        assert auth.get_username() == "mock-user"
+        assert auth.get_roles() == ["survey.main.read"]
+        assert auth.logged_in() is True
+
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_refresh_access_token_with_store(self, mock_jwt_decode, config, oauth):
+        now = datetime.now().timestamp()
+        mock_jwt_decode.return_value = JWTClaims({"username": "test-user"}, {})
+        oauth.refresh_token.return_value = OAuth2Token(
+            {"access_token": "new-token", "expires_in": 3600, "expires_at": now + 3600}
+        )
+        store = MemoryStore()
+        store.set(
+            "my-sid",
+            {
+                "access_token": "old-token",
+                "refresh_token": "my-refresh-token",
+                "expires_at": now + 30,
+                "refresh_expires_at": now + 86400,
+            },
+            86400,
+        )
+        session = {"sid": "my-sid"}
+        auth = Auth(config, oauth, session, store)
+        assert auth.logged_in() is True
+        assert session == {"sid": "my-sid"}
+        assert store.get("my-sid")["access_token"] == "new-token"
+        assert store.get("my-sid")["refresh_expires_at"] == now + 86400
+
+    def test_logout_with_store(self, config, oauth):
+        store = MemoryStore()
+        store.set("my-sid", {"access_token": "my-token"}, 60)
+        session = {"sid": "my-sid"}
+        Auth(config, oauth, session, store).logout()
+        assert session == {}
+        assert store.get("my-sid") is None
+
+    def test_logged_in_with_store_missing_record(self, config, oauth):
+        auth = Auth(config, oauth, {"sid": "unknown-sid"}, MemoryStore())
+        assert auth.logged_in() is False
+        assert auth.get_roles() == []
+
     def test_logged_in_no_token(self, auth):
         auth._session = {}
         assert auth.logged_in() is False
@@ -205,6 +642,90 @@ class TestAuth:
             auth.logged_in()
         assert str(err.value) == "foobar"
 
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_decode_token_cached(self, mock_jwt_decode, auth):
+        expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+        mock_jwt_decode.return_value = JWTClaims({"exp": expires_at}, {})
+        assert auth.decode_token("my-token") == {"exp": expires_at}
+        assert auth.decode_token("my-token") == {"exp": expires_at}
+        mock_jwt_decode.assert_called_once()
+        assert auth.token_cache_stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_decode_token_cache_expires(self, mock_jwt_decode, auth):
+        with freeze_time("2020-11-13") as frozen_time:
+            expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+            mock_jwt_decode.return_value = JWTClaims({"exp": expires_at}, {})
+            auth.decode_token("my-token")
+            frozen_time.tick(timedelta(hours=1))
+            mock_jwt_decode.return_value.validate = mock.MagicMock(
+                side_effect=ExpiredTokenError()
+            )
+            with pytest.raises(ExpiredTokenError):
+                auth.decode_token("my-token")
+        assert mock_jwt_decode.call_count == 2
+
+    @freeze_time("2020-11-13")
+    @mock.patch("authlib.jose.jwt.decode")
+    def test_decode_token_cache_cleared_on_key_rotation(
+        self, mock_jwt_decode, auth, jwks, requests_mock
+    ):
+        requests_mock.get(auth.public_key_url(), json=jwks)
+        expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+        mock_jwt_decode.return_value = JWTClaims({"exp": expires_at}, {})
+        auth.decode_token("my-token")
+        assert auth.token_cache_stats()["size"] == 1
+        requests_mock.get(auth.public_key_url(), json={"keys": []})
+        auth.get_public_keys()
+        assert auth.token_cache_stats()["size"] == 0
+
+    @freeze_time("2020-11-13")
+    def test_decode_token_signed(self, auth, rsa_key, requests_mock):
+        private_key, public_jwk = rsa_key
+        requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+        expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+        token = sign_token(private_key, public_jwk["kid"], {"exp": expires_at})
+        assert auth.decode_token(token)["exp"] == expires_at
+        assert list(auth._jwks_keys) == [public_jwk["kid"]]
+
+    @freeze_time("2020-11-13")
+    def test_get_public_key_unknown_kid_refetches(self, auth, rsa_key, requests_mock):
+        private_key, public_jwk = rsa_key
+        auth._jwks_token = {"keys": []}
+        auth._jwks_expires_at = datetime.now() + timedelta(hours=1)
+        requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+        assert auth.get_public_key(public_jwk["kid"]).as_dict() == (
+            auth._jwks_keys[public_jwk["kid"]].as_dict()
+        )
+        assert requests_mock.call_count == 1
+
+    @freeze_time("2020-11-13")
+    def test_get_public_key_unknown_kid_rate_limited(self, auth, jwks, requests_mock):
+        requests_mock.get(
+            auth.public_key_url(),
+            json=jwks,
+            headers={"cache-control": "public, max-age=86400"},
+        )
+        with pytest.raises(ValueError):
+            auth.get_public_key("unknown-kid")
+        with pytest.raises(ValueError):
+            auth.get_public_key("unknown-kid")
+        assert requests_mock.call_count == 1
+
+    @freeze_time("2020-11-13")
+    def test_get_public_key_unknown_kid_rate_limited_on_error(
+        self, auth, jwks, requests_mock
+    ):
+        requests_mock.get(auth.public_key_url(), status_code=500)
+        auth._jwks_token = jwks
+        auth._jwks_expires_at = datetime.now() + timedelta(hours=1)
+        auth._jwks_stale_until = datetime.now() + timedelta(hours=2)
+        for _ in range(5):
+            with pytest.raises(ValueError):
+                auth.get_public_key("unknown-kid")
+        assert requests_mock.call_count == 1
+
     def test_logout(self, auth):
         auth._session = {"access_token": "my-token"}
         auth.logout()
@@ -225,6 +746,8 @@ class TestAuth:
             ),
             ("survey.*.read", ["survey.main.write", "survey.main.read"], True),
             ("survey.main.read", ["survey.secondary.read", "survey.main.read"], True),
+            ("survey.*.read", ["survey"], False),
+            ("survey.*", ["survey.main.read"], False),
         ],
     )
     def test_match_role(self, role_matcher, roles, expected, auth):
@@ -246,6 +769,50 @@ class TestAuth:
         auth._session["roles"] = roles
         assert auth.has_permission(role_matchers) is expected
 
+    def test_has_permission_decision_cache(self, auth):
+        auth._session.update(
+            {"roles": ["survey.main.read"], "roles_hash": "precomputed-hash"}
+        )
+        assert auth.has_permission(["survey.*.read"]) is True
+        with mock.patch("spp_cognito_auth.base.load_role_index") as mock_role_index:
+            assert auth.has_permission(["survey.*.read"]) is True
+            assert auth.match_role("survey.*.read") is True
+        mock_role_index.assert_not_called()
+        assert auth.has_permission(["survey.*.write"]) is False
+        assert auth.decision_cache_stats() == {"hits": 2, "misses": 2, "size": 2}
+        assert list(auth._decisions._entries)[0][0] == "precomputed-hash"
+
+    def test_has_permission_shares_decisions_between_role_sets(self, auth):
+        auth._session["roles"] = ["survey.main.read", "survey.main.write"]
+        assert auth.has_permission(["survey.*.write"]) is True
+        auth._session["roles"] = ["survey.main.write", "survey.main.read"]
+        assert auth.has_permission(["survey.*.write"]) is True
+        auth._session["roles"] = ["survey.main.read"]
+        assert auth.has_permission(["survey.*.write"]) is False
+        assert auth.decision_cache_stats() == {"hits": 1, "misses": 2, "size": 2}
+
+    def test_has_permission_policy(self, auth):
+        auth._session["roles"] = ["survey.main.read", "survey.main.suspended"]
+        policy = {"all_of": ["survey.*.read", {"none_of": ["survey.*.suspended"]}]}
+        assert auth.has_permission(policy) is False
+        assert auth.has_permission(policy) is False
+        assert auth.has_permission(all_of("survey.*.read")) is True
+        assert auth.decision_cache_stats() == {"hits": 1, "misses": 2, "size": 2}
+
+    def test_decision_cache_disabled(self, config, oauth, session):
+        config.decision_cache_size = 0
+        auth = Auth(config, oauth, session)
+        session["roles"] = ["survey.main.read"]
+        assert auth.has_permission(["survey.*.read"]) is True
+        assert auth.has_permission(["survey.*.read"]) is True
+        assert auth.decision_cache_stats()["size"] == 0
+
+    def test_principal_has_permission(self, auth):
+        principal = Principal(username="user", roles=("survey.main.read",))
+        assert auth.principal_has_permission(principal, ["survey.*.read"]) is True
+        assert auth.principal_has_permission(principal, ["survey.*.write"]) is False
+        assert auth.decision_cache_stats()["misses"] == 2
+
     def test_generate_state(self, auth):
         state = auth.generate_state()
         assert is_valid_uuid(state)
@@ -261,8 +828,120 @@ class TestAuth:
         assert auth.validate_state("invalid-state") is False
 
 
+def test_validate_many(auth, rsa_key, requests_mock):
+    private_key, public_jwk = rsa_key
+    other_private_key, other_public_jwk = generate_rsa_key("other-kid")
+    requests_mock.get(
+        auth.public_key_url(),
+        json={"keys": [public_jwk, other_public_jwk]},
+        headers={"cache-control": "public, max-age=3600"},
+    )
+    now = int(datetime.now().timestamp())
+    valid = sign_token(private_key, "test-kid", {"exp": now + 3600})
+    other = sign_token(other_private_key, "other-kid", {"exp": now + 3600})
+    expired = sign_token(private_key, "test-kid", {"exp": now - 60})
+    forged = sign_token(other_private_key, "test-kid", {"exp": now + 3600})
+    unknown = sign_token(private_key, "unknown-kid", {"exp": now + 3600})
+    results = auth.validate_many(
+        [valid, other, expired, valid, forged, unknown, "not-a-token"]
+    )
+    assert results[0]["exp"] == now + 3600
+    assert results[1]["exp"] == now + 3600
+    assert isinstance(results[2], ExpiredTokenError)
+    assert results[3] is results[0]
+    assert isinstance(results[4], JoseError)
+    assert isinstance(results[5], ValueError)
+    assert isinstance(results[6], DecodeError)
+    assert requests_mock.call_count == 1
+    assert auth.validate_many([valid])[0] is results[0]
+    assert auth.validate_many([]) == []
+
+
+@pytest.mark.parametrize(
+    "authorization",
+    [None, "", "Bearer", "Bearer ", "Basic dXNlcjpwYXNz", "Bearer not-a-token"],
+)
+def test_get_bearer_principal_invalid(authorization, auth):
+    assert auth.get_bearer_principal(authorization) is None
+    assert auth._session == {}
+
+
+def test_get_bearer_principal(auth, rsa_key, requests_mock):
+    private_key, public_jwk = rsa_key
+    requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+    expires_at = int(datetime.now().timestamp()) + 3600
+    token = sign_token(
+        private_key,
+        public_jwk["kid"],
+        {"username": "test-user", "cognito:groups": ["a.b.c"], "exp": expires_at},
+    )
+    principal = auth.get_bearer_principal(f"bearer {token}")
+    assert principal.username == "test-user"
+    assert principal.roles == ("a.b.c",)
+    assert principal.expires_at == expires_at
+    with mock.patch.object(Auth, "decode_token") as mock_decode_token:
+        assert auth.get_bearer_principal(f"Bearer {token}") is principal
+    mock_decode_token.assert_not_called()
+    with mock.patch("spp_cognito_auth.base.roles_digest") as mock_roles_digest:
+        assert auth.principal_has_permission(principal, ["a.*.c"]) is True
+    mock_roles_digest.assert_not_called()
+    assert auth._session == {}
+
+
 def test_new_oauth_client(config):
     oauth2_session = new_oauth_client(config)
     assert oauth2_session.client_id == config.client_id
     assert oauth2_session.client_secret == config.client_secret
     assert oauth2_session.redirect_uri == config.callback_url
+    assert oauth2_session.get_adapter(config.cognito_domain) is http_adapter(config)
+
+
+def test_transport_stats(auth):
+    assert auth.transport_stats() == {"connections": 0, "requests": 0}
+
+
+def test_health_before_warm_up(auth):
+    assert auth.health() == {
+        "status": "unavailable",
+        "keys": 0,
+        "key_age": None,
+        "next_refresh_in": None,
+        "last_fetch_latency": None,
+    }
+
+
+def test_warm_up(auth, rsa_key, requests_mock):
+    requests_mock.get(
+        auth.public_key_url(),
+        json={"keys": [rsa_key[1]]},
+        headers={"cache-control": "public, max-age=3600"},
+    )
+    requests_mock.head(auth.public_key_url())
+    requests_mock.head(auth.token_url(), status_code=405)
+    health = auth.warm_up()
+    assert health["status"] == "ok"
+    assert health["keys"] == 1
+    assert 0 <= health["key_age"] < 1
+    assert 3530 < health["next_refresh_in"] <= 3540
+    assert health["last_fetch_latency"] >= 0
+    assert list(auth._jwks_keys) == ["test-kid"]
+    assert [request.method for request in requests_mock.request_history] == [
+        "GET",
+        "HEAD",
+        "HEAD",
+    ]
+
+
+def test_warm_up_without_connect(auth, rsa_key, requests_mock):
+    requests_mock.get(auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    auth._config.jwks_refresh_ahead = 0
+    health = auth.warm_up(connect=False)
+    assert 0 < health["next_refresh_in"] <= auth._config.jwks_min_ttl
+    assert requests_mock.call_count == 1
+
+
+def test_warm_up_connection_failure(auth, rsa_key, requests_mock):
+    requests_mock.get(auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    requests_mock.head(auth.public_key_url())
+    requests_mock.head(auth.token_url(), exc=requests.exceptions.ConnectTimeout)
+    assert auth.warm_up()["status"] == "ok"
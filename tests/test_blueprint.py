@@ -1,5 +1,7 @@
 from unittest import mock
 
+from flask import render_template_string
+
 from spp_cognito_auth import Auth, AuthBlueprint
 
 
@@ -14,7 +16,7 @@ def test_auth_blueprint_logout(flask_app, client):
         + "client_id=test-client-id&"
         + "response_type=code&"
         + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-        + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+        + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
         + "state="
     )
     assert flask_app.auth._session["state"] != "old-state"
@@ -55,7 +57,7 @@ def test_auth_blueprint_callback_no_state(flask_app, client):
         + "client_id=test-client-id&"
         + "response_type=code&"
         + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-        + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+        + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
         + "state="
     )
     assert flask_app.auth._session["state"] != "fake-state-uuid"
@@ -71,7 +73,32 @@ def test_auth_blueprint_callback_invalid_state(flask_app, client):
         + "client_id=test-client-id&"
         + "response_type=code&"
         + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-        + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+        + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
         + "state="
     )
     assert flask_app.auth._session["state"] != "fake-state-uuid"
+
+
+def test_auth_blueprint_health(flask_app, client, rsa_key, requests_mock):
+    flask_app.register_blueprint(AuthBlueprint().blueprint())
+    response = client.get("/auth/health")
+    assert response.status_code == 503
+    assert response.get_json()["status"] == "unavailable"
+    requests_mock.get(flask_app.auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    flask_app.auth.warm_up(connect=False)
+    response = client.get("/auth/health")
+    assert response.status_code == 200
+    assert response.get_json()["keys"] == 1
+
+
+@mock.patch.object(Auth, "logged_in")
+def test_auth_blueprint_template_globals(mock_logged_in, flask_app):
+    flask_app.register_blueprint(AuthBlueprint().blueprint())
+    flask_app.auth._session["roles"] = ["survey.main.read"]
+    template = (
+        "{% if has_permission(all_of('survey.*.read', none_of('survey.*.write'))) %}"
+        + "reader{% endif %}"
+        + "{% if has_permission(any_of('survey.*.write')) %}writer{% endif %}"
+    )
+    with flask_app.test_request_context("/"):
+        assert render_template_string(template) == "reader"
@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+from freezegun import freeze_time
+
+from spp_cognito_auth.cache import DecisionCache, TokenCache, roles_digest, token_digest
+from spp_cognito_auth.roles import compile_matchers
+
+
+def test_token_digest():
+    assert token_digest("my-token") == token_digest("my-token")
+    assert token_digest("my-token") != token_digest("other-token")
+    assert "my-token" not in token_digest("my-token")
+
+
+@freeze_time("2020-11-13")
+def test_get_set():
+    cache = TokenCache()
+    expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+    assert cache.get("my-token") is None
+    cache.set("my-token", {"foo": "bar"}, expires_at)
+    assert cache.get("my-token") == {"foo": "bar"}
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_expired_entry():
+    cache = TokenCache()
+    with freeze_time("2020-11-13") as frozen_time:
+        expires_at = (datetime.now() + timedelta(minutes=5)).timestamp()
+        cache.set("my-token", {"foo": "bar"}, expires_at)
+        frozen_time.tick(timedelta(minutes=5))
+        assert cache.get("my-token") is None
+    assert len(cache) == 0
+
+
+@freeze_time("2020-11-13")
+def test_already_expired_not_stored():
+    cache = TokenCache()
+    cache.set("my-token", {"foo": "bar"}, datetime(2020, 1, 1).timestamp())
+    assert len(cache) == 0
+
+
+@freeze_time("2020-11-13")
+def test_evicts_least_recently_used():
+    cache = TokenCache(maxsize=2)
+    expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+    cache.set("token-1", 1, expires_at)
+    cache.set("token-2", 2, expires_at)
+    cache.get("token-1")
+    cache.set("token-3", 3, expires_at)
+    assert cache.get("token-1") == 1
+    assert cache.get("token-2") is None
+    assert cache.get("token-3") == 3
+
+
+@freeze_time("2020-11-13")
+def test_disabled():
+    cache = TokenCache(maxsize=0)
+    cache.set("my-token", 1, (datetime.now() + timedelta(hours=1)).timestamp())
+    assert cache.get("my-token") is None
+
+
+@freeze_time("2020-11-13")
+def test_delete_and_clear():
+    cache = TokenCache()
+    expires_at = (datetime.now() + timedelta(hours=1)).timestamp()
+    cache.set("token-1", 1, expires_at)
+    cache.set("token-2", 2, expires_at)
+    cache.delete("token-1")
+    assert cache.get("token-1") is None
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_roles_digest():
+    assert roles_digest(["b", "a", "a"]) == roles_digest(["a", "b"])
+    assert roles_digest(["a", "b"]) != roles_digest(["a.b"])
+    assert len(roles_digest([])) == 32
+
+
+def test_decision_cache():
+    cache = DecisionCache()
+    key = (roles_digest(["survey.main.read"]), compile_matchers(["survey.*.read"]))
+    assert cache.get(key) is None
+    cache.set(key, False)
+    assert cache.get(key) is False
+    assert cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+def test_decision_cache_evicts_least_recently_used():
+    cache = DecisionCache(maxsize=2)
+    matchers = compile_matchers(["survey.*.read"])
+    cache.set(("a", matchers), True)
+    cache.set(("b", matchers), True)
+    cache.get(("a", matchers))
+    cache.set(("c", matchers), False)
+    assert cache.get(("b", matchers)) is None
+    assert cache.get(("a", matchers)) is True
+    assert len(cache) == 2
@@ -0,0 +1,99 @@
+import time
+from dataclasses import replace
+
+import pytest
+from authlib.jose.errors import InvalidClaimError, InvalidTokenError, MissingClaimError
+from helpers import invalid_token, sign_token
+
+from spp_cognito_auth import Auth
+from spp_cognito_auth.claims import claims_options
+
+
+@pytest.fixture
+def decode(config, rsa_key, requests_mock):
+    private_key, public_jwk = rsa_key
+
+    def decode(claims, **config_changes):
+        auth = Auth(replace(config, **config_changes), None, {})
+        requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+        claims.setdefault("exp", int(time.time()) + 3600)
+        return auth.decode_token(sign_token(private_key, public_jwk["kid"], claims))
+
+    return decode
+
+
+def test_claims_options(config):
+    assert claims_options(config) == {
+        "iss": {"essential": True, "value": "https://test-cognito-endpoint.test.com"},
+        "client_id": {"value": "test-client-id"},
+        "token_use": {"essential": True, "value": "access"},
+    }
+
+
+def test_claims_options_disabled(config):
+    config = replace(
+        config, verify_issuer=False, verify_client_id=False, token_use=None
+    )
+    assert claims_options(config) == {}
+
+
+def test_valid_claims(decode):
+    assert decode({"username": "test-user"})["username"] == "test-user"
+
+
+@pytest.mark.parametrize(
+    "claims, error",
+    [
+        ({"iss": "https://evil.example.com"}, InvalidClaimError),
+        ({"iss": None}, MissingClaimError),
+        ({"client_id": "other-client-id"}, InvalidClaimError),
+        ({"client_id": None}, MissingClaimError),
+        ({"token_use": "id"}, InvalidClaimError),
+        ({"nbf": int(time.time()) + 60}, InvalidTokenError),
+    ],
+)
+def test_invalid_claims(claims, error, decode):
+    with pytest.raises(error):
+        decode(claims)
+
+
+def test_audience_used_when_no_client_id(decode):
+    assert decode({"client_id": None, "aud": "test-client-id"})["aud"] == (
+        "test-client-id"
+    )
+
+
+def test_leeway(decode):
+    claims = {"nbf": int(time.time()) + 30}
+    assert decode(claims, token_leeway=60)["nbf"] == claims["nbf"]
+
+
+def test_checks_disabled(decode):
+    claims = decode(
+        {"iss": "https://other.example.com", "client_id": "other", "token_use": "id"},
+        verify_issuer=False,
+        verify_client_id=False,
+        token_use=None,
+    )
+    assert claims["token_use"] == "id"
+
+
+def test_logged_in_invalid_claims(config, rsa_key, requests_mock):
+    private_key, public_jwk = rsa_key
+    auth = Auth(config, None, {})
+    requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+    auth._session["access_token"] = sign_token(
+        private_key,
+        public_jwk["kid"],
+        {"token_use": "id", "exp": int(time.time()) + 3600},
+    )
+    assert auth.logged_in() is False
+
+
+@pytest.mark.parametrize("kind", ["forged", "malformed", "unknown-kid"])
+def test_logged_in_invalid_token(config, rsa_key, requests_mock, kind):
+    private_key, public_jwk = rsa_key
+    auth = Auth(config, None, {})
+    requests_mock.get(auth.public_key_url(), json={"keys": [public_jwk]})
+    auth._session["access_token"] = invalid_token(kind, private_key, public_jwk["kid"])
+    assert auth.logged_in() is False
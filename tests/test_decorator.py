@@ -1,6 +1,21 @@
+import time
 from unittest import mock
 
+import pytest
+from flask import g
+from helpers import sign_token
+
 import spp_cognito_auth
+from spp_cognito_auth import (
+    Principal,
+    all_of,
+    any_of,
+    current_principal,
+    has_permission,
+    none_of,
+    requires_auth,
+    requires_role,
+)
 
 
 @mock.patch.object(spp_cognito_auth.Auth, "logged_in")
@@ -21,16 +36,49 @@ def test_required_auth_logged_out(mock_logged_in, client, flask_app):
         + "client_id=test-client-id&"
         + "response_type=code&"
         + "scope=aws.cognito.signin.user.admin+email+openid+phone+profile&"
-        + "redirect_uri=http://test-app-host.test.com/auth/callback&"
+        + "redirect_uri=http%3A%2F%2Ftest-app-host.test.com%2Fauth%2Fcallback&"
         + "state="
     )
     assert flask_app.auth.get_redirect() == "http://localhost/"
 
 
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {"Sec-Fetch-Mode": "cors"},
+        {"X-Requested-With": "XMLHttpRequest"},
+        {"Accept": "application/json, text/plain, */*"},
+    ],
+)
+@mock.patch.object(spp_cognito_auth.Auth, "logged_in")
+def test_required_auth_logged_out_fetch(mock_logged_in, client, flask_app, headers):
+    mock_logged_in.return_value = False
+    with mock.patch.object(flask_app.auth, "generate_state") as mock_generate_state:
+        response = client.get("/", headers=headers)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == 'Session realm="login"'
+    assert "Location" not in response.headers
+    assert "Set-Cookie" not in response.headers
+    mock_generate_state.assert_not_called()
+    assert flask_app.auth._session == {}
+
+
+@pytest.mark.parametrize(
+    "headers",
+    [
+        {},
+        {"Sec-Fetch-Mode": "navigate", "Accept": "application/json"},
+        {"Accept": "text/html,application/xhtml+xml,*/*;q=0.8"},
+    ],
+)
+def test_is_navigation(flask_app, headers):
+    assert spp_cognito_auth.decorator.is_navigation(headers)
+
+
 @mock.patch.object(spp_cognito_auth.Auth, "logged_in")
-@mock.patch.object(spp_cognito_auth.Auth, "match_role")
-def test_required_roles_authorised(mock_match_role, mock_logged_in, client):
-    mock_match_role.return_value = True
+@mock.patch.object(spp_cognito_auth.Auth, "has_permission")
+def test_required_roles_authorised(mock_has_permission, mock_logged_in, client):
+    mock_has_permission.return_value = True
     mock_logged_in.return_value = True
     response = client.get("/test-roles")
     assert response.status_code == 200
@@ -38,9 +86,113 @@ def test_required_roles_authorised(mock_match_role, mock_logged_in, client):
 
 
 @mock.patch.object(spp_cognito_auth.Auth, "logged_in")
-@mock.patch.object(spp_cognito_auth.Auth, "match_role")
-def test_required_roles_not_authorised(mock_match_role, mock_logged_in, client):
-    mock_match_role.return_value = False
+@mock.patch.object(spp_cognito_auth.Auth, "has_permission")
+def test_required_roles_not_authorised(mock_has_permission, mock_logged_in, client):
+    mock_has_permission.return_value = False
     mock_logged_in.return_value = True
     response = client.get("/test-roles")
     assert response.status_code == 403
+
+
+@mock.patch.object(spp_cognito_auth.Auth, "logged_in")
+def test_required_roles_compiled_once(mock_logged_in, client, flask_app):
+    mock_logged_in.return_value = True
+    flask_app.auth._session["roles"] = ["survey.main.write"]
+    with mock.patch.object(
+        spp_cognito_auth.Auth, "has_permission", wraps=flask_app.auth.has_permission
+    ) as mock_has_permission:
+        response = client.get("/test-roles")
+    assert response.status_code == 200
+    policy = mock_has_permission.call_args[0][0]
+    assert policy == any_of("survey.main.read", "survey.main.write")
+
+
+@mock.patch.object(spp_cognito_auth.Auth, "get_principal")
+@mock.patch.object(spp_cognito_auth.Auth, "has_permission")
+def test_auth_state_computed_once_per_request(
+    mock_has_permission, mock_get_principal, flask_app
+):
+    mock_get_principal.return_value = Principal(username="test-user")
+    mock_has_permission.return_value = True
+    with flask_app.test_request_context("/test-roles"):
+        response = flask_app.view_functions["test_roles"]()
+        assert response == "Welcome to the Role endpoint!"
+        assert current_principal() == Principal(username="test-user")
+        assert has_permission(["survey.main.read", "survey.main.write"]) is True
+    mock_get_principal.assert_called_once()
+    mock_has_permission.assert_called_once()
+
+
+@mock.patch.object(spp_cognito_auth.Auth, "logged_in")
+def test_current_principal_logged_out(mock_logged_in, flask_app):
+    mock_logged_in.return_value = False
+    with flask_app.test_request_context("/"):
+        assert current_principal() is None
+        assert current_principal() is None
+    mock_logged_in.assert_called_once()
+
+
+def test_has_permission_memoized_per_matcher_set(flask_app):
+    with flask_app.test_request_context("/"):
+        flask_app.auth._session["roles"] = ["survey.main.read"]
+        assert has_permission(["survey.*.read"]) is True
+        assert has_permission(["survey.*.write"]) is False
+        assert len(g.spp_cognito_auth_permissions) == 2
+
+
+def bearer_headers(rsa_key, **claims):
+    private_key, public_jwk = rsa_key
+    claims.setdefault("username", "test-user")
+    claims.setdefault("exp", int(time.time()) + 3600)
+    token = sign_token(private_key, public_jwk["kid"], claims)
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_requires_bearer_auth(client, flask_app, rsa_key, requests_mock):
+    requests_mock.get(flask_app.auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    headers = bearer_headers(rsa_key, **{"cognito:groups": ["survey.main.read"]})
+    response = client.get("/api", headers=headers)
+    assert response.status_code == 200
+    assert response.data == b"Welcome to the API!"
+    assert flask_app.auth._session == {}
+
+
+def test_requires_bearer_auth_missing_token(client, flask_app):
+    response = client.get("/api")
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == "Bearer"
+    assert flask_app.auth._session == {}
+
+
+def test_requires_bearer_auth_invalid_token(client, flask_app, rsa_key, requests_mock):
+    requests_mock.get(flask_app.auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    headers = bearer_headers(rsa_key, exp=int(time.time()) - 60)
+    response = client.get("/api", headers=headers)
+    assert response.status_code == 401
+    assert response.headers["WWW-Authenticate"] == 'Bearer error="invalid_token"'
+    assert flask_app.auth._session == {}
+
+
+def test_requires_bearer_auth_uses_token_roles(
+    client, flask_app, rsa_key, requests_mock
+):
+    requests_mock.get(flask_app.auth.public_key_url(), json={"keys": [rsa_key[1]]})
+    flask_app.auth._session["roles"] = ["survey.main.read"]
+    headers = bearer_headers(rsa_key, **{"cognito:groups": ["survey.other.read"]})
+    response = client.get("/api", headers=headers)
+    assert response.status_code == 403
+
+
+@mock.patch.object(spp_cognito_auth.Auth, "logged_in")
+def test_requires_role_policy(mock_logged_in, flask_app):
+    mock_logged_in.return_value = True
+
+    @flask_app.route("/policy")
+    @requires_auth
+    @requires_role(all_of("survey.*.read", none_of("survey.*.suspended")))
+    def policy():
+        return "Welcome!"
+
+    flask_app.auth._session["roles"] = ["survey.main.read", "survey.main.suspended"]
+    assert flask_app.test_client().get("/policy").status_code == 403
+    assert flask_app.auth.has_permission(all_of("survey.*.read"))
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+import pytest
+
+import spp_cognito_auth
+
+HEAVY_MODULES = ["authlib", "cachecontrol", "flask", "requests", "werkzeug"]
+
+
+def imported_modules(code):
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys\n{code}\nprint(*sorted(sys.modules))"],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    return {module.split(".")[0] for module in result.stdout.split()}
+
+
+def test_import_is_lazy():
+    modules = imported_modules(
+        "import spp_cognito_auth\n"
+        + "from spp_cognito_auth import AuthConfig, MemoryStore, Principal"
+    )
+    assert "spp_cognito_auth" in modules
+    assert modules.isdisjoint(HEAVY_MODULES)
+
+
+def test_lazy_attribute_imports_dependencies():
+    modules = imported_modules("from spp_cognito_auth import Auth")
+    assert {"authlib", "requests"} <= modules
+
+
+def test_lazy_attributes():
+    from spp_cognito_auth.auth import Auth
+    from spp_cognito_auth.decorator import requires_role
+
+    assert spp_cognito_auth.Auth is Auth
+    assert spp_cognito_auth.requires_role is requires_role
+    assert set(spp_cognito_auth.__all__) <= set(dir(spp_cognito_auth))
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        spp_cognito_auth.not_an_attribute
@@ -0,0 +1,48 @@
+import os
+from datetime import datetime
+
+from spp_cognito_auth.jwks import (
+    JWKSSnapshot,
+    compile_jwks,
+    load_jwks_snapshot,
+    save_jwks_snapshot,
+)
+
+
+def test_compile_jwks(rsa_key):
+    _, public_jwk = rsa_key
+    keys = compile_jwks({"keys": [public_jwk]})
+    assert list(keys) == ["test-kid"]
+    assert keys["test-kid"].as_dict()["n"] == public_jwk["n"]
+
+
+def test_compile_jwks_skips_invalid_keys(rsa_key):
+    _, public_jwk = rsa_key
+    keys = compile_jwks({"keys": [{"kid": "broken", "kty": "RSA"}, public_jwk]})
+    assert list(keys) == ["test-kid"]
+
+
+def test_compile_jwks_empty():
+    assert compile_jwks({}) == {}
+
+
+def test_save_load_jwks_snapshot(tmp_path, jwks):
+    path = str(tmp_path / "jwks.json")
+    snapshot = JWKSSnapshot(
+        jwks=jwks,
+        expires_at=datetime(2020, 11, 14),
+        stale_until=datetime(2020, 11, 15),
+    )
+    save_jwks_snapshot(path, snapshot)
+    assert load_jwks_snapshot(path) == snapshot
+    assert os.listdir(str(tmp_path)) == ["jwks.json"]
+
+
+def test_load_jwks_snapshot_missing(tmp_path):
+    assert load_jwks_snapshot(str(tmp_path / "jwks.json")) is None
+
+
+def test_load_jwks_snapshot_invalid(tmp_path):
+    path = tmp_path / "jwks.json"
+    path.write_text("{not json")
+    assert load_jwks_snapshot(str(path)) is None
@@ -0,0 +1,154 @@
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from authlib.jose.errors import ExpiredTokenError
+from flask import Flask
+from helpers import sign_token
+
+from spp_cognito_auth import (
+    Auth,
+    CallbackMetrics,
+    Metrics,
+    PrometheusMetrics,
+    requires_auth,
+    requires_role,
+)
+
+
+@pytest.fixture
+def events():
+    return []
+
+
+@pytest.fixture
+def metrics_auth(config, session, events):
+    return Auth(
+        config,
+        None,
+        session,
+        metrics=CallbackMetrics(lambda *event: events.append(event)),
+    )
+
+
+@pytest.fixture
+def token(rsa_key, requests_mock, config):
+    private_key, public_jwk = rsa_key
+    requests_mock.get(
+        "https://test-cognito-endpoint.test.com/.well-known/jwks.json",
+        json={"keys": [public_jwk]},
+    )
+
+    def token(**claims):
+        claims.setdefault("exp", int(time.time()) + 3600)
+        return sign_token(private_key, public_jwk["kid"], claims)
+
+    return token
+
+
+def names(events, name):
+    return [labels for event, _, labels in events if event == name]
+
+
+def test_no_metrics_not_instrumented(auth):
+    assert auth.metrics is None
+    assert "_verify_token" not in vars(auth)
+    assert "_cached_claims" not in vars(auth)
+
+
+def test_decode_token_metrics(metrics_auth, token, events):
+    access_token = token()
+    metrics_auth.decode_token(access_token)
+    metrics_auth.decode_token(access_token)
+    operations = [labels["operation"] for labels in names(events, "latency")]
+    assert operations.count("jwks_fetch") == 1
+    assert operations.count("token_verify") == 1
+    assert names(events, "cache") == [
+        {"cache": "token", "hit": False},
+        {"cache": "token", "hit": True},
+    ]
+
+
+def test_failure_metrics(metrics_auth, token, events):
+    metrics_auth._session["access_token"] = token(exp=int(time.time()) - 60)
+    assert metrics_auth.logged_in() is False
+    assert names(events, "failure") == [
+        {"operation": "token_verify", "reason": "ExpiredTokenError"}
+    ]
+
+
+def test_stale_jwks_failure_metrics(metrics_auth, jwks, events, requests_mock):
+    requests_mock.get(metrics_auth.public_key_url(), status_code=500)
+    metrics_auth._jwks_token = jwks
+    metrics_auth._jwks_expires_at = datetime.now() - timedelta(hours=1)
+    metrics_auth._jwks_stale_until = datetime.now() + timedelta(hours=1)
+    assert metrics_auth.get_public_keys() == jwks
+    assert names(events, "failure") == [
+        {"operation": "jwks_fetch", "reason": "HTTPError"}
+    ]
+
+
+def test_match_role_metrics(metrics_auth, events):
+    metrics_auth.match_role("survey.*.read")
+    operations = [labels["operation"] for labels in names(events, "latency")]
+    assert operations == ["match_role"]
+
+
+def test_denied_metrics(metrics_auth, events):
+    app = Flask(__name__)
+    app.auth = metrics_auth
+
+    @app.route("/")
+    @requires_auth
+    def root():
+        return "Hello, World!"
+
+    @app.route("/roles")
+    @requires_role(["survey.main.read"])
+    def roles():
+        return "Welcome to the Role endpoint!"
+
+    client = app.test_client()
+    assert client.get("/").status_code == 302
+    assert client.get("/roles").status_code == 403
+    assert names(events, "denied") == [
+        {"endpoint": "root", "status": 401},
+        {"endpoint": "roles", "status": 403},
+    ]
+
+
+def test_metrics_base_is_noop():
+    metrics = Metrics()
+    metrics.observe("token_verify", 0.1)
+    metrics.cache("token", True)
+    metrics.failure("token_verify", "ExpiredTokenError")
+    metrics.denied("root", 401)
+
+
+def test_prometheus_metrics(config, session, token):
+    prometheus_client = pytest.importorskip("prometheus_client")
+    registry = prometheus_client.CollectorRegistry()
+    auth = Auth(config, None, session, metrics=PrometheusMetrics(registry))
+    access_token = token()
+    auth.decode_token(access_token)
+    auth.decode_token(access_token)
+    with pytest.raises(ExpiredTokenError):
+        auth.decode_token(token(exp=int(time.time()) - 60))
+    sample = registry.get_sample_value
+    assert (
+        sample("spp_cognito_auth_operation_seconds_count", {"operation": "jwks_fetch"})
+        == 1
+    )
+    assert (
+        sample(
+            "spp_cognito_auth_cache_lookups_total", {"cache": "token", "result": "hit"}
+        )
+        == 1
+    )
+    assert (
+        sample(
+            "spp_cognito_auth_failures_total",
+            {"operation": "token_verify", "reason": "ExpiredTokenError"},
+        )
+        == 1
+    )
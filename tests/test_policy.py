@@ -0,0 +1,79 @@
+from unittest import mock
+
+import pytest
+
+from spp_cognito_auth import Policy, all_of, any_of, compile_policy, none_of
+from spp_cognito_auth.roles import RoleIndex, compile_matcher
+
+ROLES = RoleIndex(["survey.main.read", "survey.main.write", "account.suspended"])
+
+
+@pytest.mark.parametrize(
+    "policy,expected",
+    [
+        (all_of("survey.*.read", "survey.*.write"), True),
+        (all_of("survey.*.read", "survey.*.admin"), False),
+        (any_of("survey.*.admin", "survey.main.read"), True),
+        (any_of("survey.*.admin", "other.*.*"), False),
+        (none_of("survey.*.admin"), True),
+        (none_of("account.suspended"), False),
+        (all_of("survey.*.read", none_of("account.suspended")), False),
+        (all_of("survey.*.read", any_of("other.*.*", "survey.main.write")), True),
+        (all_of(), True),
+        (any_of(), False),
+        (none_of(), True),
+    ],
+)
+def test_evaluate(policy, expected):
+    assert policy.evaluate(ROLES) is expected
+
+
+@pytest.mark.parametrize(
+    "rules,expected",
+    [
+        ("survey.*.read", any_of("survey.*.read")),
+        (compile_matcher("survey.*.read"), any_of("survey.*.read")),
+        (["survey.*.read", "other.*.*"], any_of("survey.*.read", "other.*.*")),
+        (
+            {"all_of": ["survey.*.read", {"none_of": "account.suspended"}]},
+            all_of("survey.*.read", none_of("account.suspended")),
+        ),
+        ({"any_of": [["a.b.c"], "d.e.f"]}, any_of(any_of("a.b.c"), "d.e.f")),
+    ],
+)
+def test_compile_policy(rules, expected):
+    assert compile_policy(rules) == expected
+
+
+def test_compile_policy_reuses_compiled():
+    policy = all_of("survey.*.read")
+    assert compile_policy(policy) is policy
+    assert compile_policy(["survey.*.read"]) is compile_policy(["survey.*.read"])
+    assert hash(all_of("a.b.c")) == hash(all_of("a.b.c"))
+    assert all_of("a.b.c") != any_of("a.b.c")
+
+
+@pytest.mark.parametrize(
+    "rules", [{"not_of": ["survey.*.read"]}, {"all_of": [], "any_of": []}]
+)
+def test_compile_policy_invalid(rules):
+    with pytest.raises(ValueError):
+        compile_policy(rules)
+
+
+def test_evaluate_matches_each_matcher_once():
+    policy = all_of(
+        "survey.*.read",
+        any_of("survey.*.read", "survey.main.write"),
+        none_of("survey.*.read", "account.*"),
+    )
+    with mock.patch.object(RoleIndex, "match", wraps=ROLES.match) as mock_match:
+        assert policy.evaluate(ROLES) is False
+    assert mock_match.call_count == 1
+
+
+def test_repr():
+    assert (
+        repr(all_of("a.*.c", none_of("d.e.f"))) == "all_of('a.*.c', none_of('d.e.f'))"
+    )
+    assert isinstance(all_of(), Policy)
@@ -0,0 +1,19 @@
+from spp_cognito_auth import Principal, all_of, none_of
+
+
+def test_principal_has_permission():
+    principal = Principal(
+        username="test-user", roles=("survey.main.read", "survey.main.write")
+    )
+    assert principal.has_permission(["survey.*.read"]) is True
+    assert principal.has_permission(["survey.*.manager", "other.*.*"]) is False
+    assert principal.has_permission(all_of("survey.*.read", "survey.*.write"))
+    assert not principal.has_permission(none_of("survey.main.*"))
+
+
+def test_principal_defaults():
+    principal = Principal(username="test-user")
+    assert principal.roles == ()
+    assert principal.claims == {}
+    assert principal.expires_at is None
+    assert principal.has_permission(["survey.*.read"]) is False
@@ -0,0 +1,98 @@
+import pytest
+
+from spp_cognito_auth.roles import (
+    RoleIndex,
+    RoleMatcher,
+    compile_matcher,
+    compile_matchers,
+    decode_roles,
+    encode_roles,
+    load_role_index,
+    load_roles,
+    role_index,
+)
+
+
+def test_role_matcher():
+    matcher = RoleMatcher("survey.*.read")
+    assert matcher.segments == ("survey", None, "read")
+    assert matcher.exact is False
+    assert RoleMatcher("survey.main.read").exact is True
+    assert matcher == RoleMatcher("survey.*.read")
+    assert hash(matcher) == hash(RoleMatcher("survey.*.read"))
+
+
+@pytest.mark.parametrize(
+    "role_matcher,roles,expected",
+    [
+        ("survey.main.read", ["survey.main.read"], True),
+        ("survey.*.read", ["survey.main.read", "survey.other.write"], True),
+        ("*.*.*", ["survey.main.read"], True),
+        ("survey.*", ["survey.main.read"], False),
+        ("survey.*.read.extra", ["survey.main.read"], False),
+        ("survey.*.read", ["survey"], False),
+        ("survey.*.*", ["survey.main"], False),
+        ("dev", ["survey.main.read"], False),
+        ("dev", ["dev"], True),
+        ("survey.*.read", [], False),
+    ],
+)
+def test_role_index_match(role_matcher, roles, expected):
+    assert RoleIndex(roles).match(RoleMatcher(role_matcher)) is expected
+
+
+def test_role_index_match_any():
+    index = RoleIndex(["survey.main.read"])
+    assert index.match_any(compile_matchers(["dev", "survey.*.read"])) is True
+    assert index.match_any(compile_matchers(["dev", "survey.*.write"])) is False
+    assert index.match_any([]) is False
+
+
+def test_compile_matcher_reuses_compiled():
+    matcher = compile_matcher("survey.*.read")
+    assert compile_matcher("survey.*.read") is matcher
+    assert compile_matcher(matcher) is matcher
+
+
+def test_role_index_memoized():
+    assert role_index(("survey.main.read",)) is role_index(("survey.main.read",))
+
+
+@pytest.mark.parametrize(
+    "roles",
+    [
+        [],
+        [""],
+        ["survey.main.read"],
+        ["survey.main.write", "survey.main.read", "survey.main.read", "survey"],
+        ["a,b", "a\\,b", "a\\", "a.b,c.d"],
+        ["x" * 100 + ".read", "x" * 100 + ".write"],
+    ],
+)
+def test_encode_roles_round_trip(roles):
+    assert decode_roles(encode_roles(roles)) == tuple(sorted(set(roles)))
+
+
+def test_encode_roles_prefix_compressed():
+    assert encode_roles(
+        ["survey.main.write", "survey.main.read", "survey.other.read"]
+    ) == ("1:0survey.main.read,cwrite,7other.read")
+
+
+def test_decode_roles_unsupported_version():
+    with pytest.raises(ValueError):
+        decode_roles("2:0survey.main.read")
+
+
+def test_load_roles_reads_list_format():
+    assert load_roles(["survey.main.read"]) == ("survey.main.read",)
+    assert load_roles("1:0survey.main.read") == ("survey.main.read",)
+    assert load_roles(None) == ()
+
+
+def test_load_role_index():
+    index = load_role_index("1:0survey.main.read,cwrite")
+    assert index is load_role_index("1:0survey.main.read,cwrite")
+    assert index.match(compile_matcher("survey.*.write"))
+    assert load_role_index(["survey.main.read"]).roles == {"survey.main.read"}
+    assert load_role_index(None).roles == frozenset()
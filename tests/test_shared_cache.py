@@ -0,0 +1,87 @@
+import time
+from dataclasses import replace
+from unittest import mock
+
+import pytest
+from helpers import FakeRedis, sign_token
+
+from spp_cognito_auth import Auth, FileStore, MemoryStore, RedisStore
+from spp_cognito_auth.base import JWKS_CACHE_KEY
+from spp_cognito_auth.testing import generate_rsa_key
+
+
+@pytest.fixture(params=["memory", "file", "redis"])
+def cache(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    if request.param == "file":
+        return FileStore(str(tmp_path))
+    return RedisStore(FakeRedis())
+
+
+@pytest.fixture
+def token(rsa_key):
+    private_key, public_jwk = rsa_key
+    return sign_token(
+        private_key,
+        public_jwk["kid"],
+        {"username": "test-user", "exp": time.time() + 60},
+    )
+
+
+@pytest.fixture
+def jwks_mock(config, rsa_key, requests_mock):
+    return requests_mock.get(
+        Auth(config, None, {}).public_key_url(),
+        json={"keys": [rsa_key[1]]},
+        headers={"cache-control": "public, max-age=3600"},
+    )
+
+
+def test_public_keys_shared(config, cache, jwks_mock, rsa_key):
+    Auth(config, None, {}, cache=cache).get_public_keys()
+    auth = Auth(config, None, {}, cache=cache)
+    assert auth.get_public_keys() == {"keys": [rsa_key[1]]}
+    assert jwks_mock.call_count == 1
+    assert cache.get(JWKS_CACHE_KEY)["jwks"] == {"keys": [rsa_key[1]]}
+
+
+def test_verified_tokens_shared(config, cache, jwks_mock, token):
+    Auth(config, None, {}, cache=cache).decode_token(token)
+    auth = Auth(config, None, {}, cache=cache)
+    with mock.patch("authlib.jose.jwt.decode") as mock_jwt_decode:
+        claims = auth.decode_token(token)
+    mock_jwt_decode.assert_not_called()
+    assert claims["username"] == "test-user"
+    assert claims.header["kid"] == "test-kid"
+    assert auth.token_cache_stats()["size"] == 1
+
+
+def test_shared_token_needs_current_key(config, cache, jwks_mock, token):
+    Auth(config, None, {}, cache=cache).decode_token(token)
+    auth = Auth(config, None, {}, cache=cache)
+    auth._jwks_keys = {"other-kid": generate_rsa_key("other-kid")[0]}
+    assert auth._cached_claims(token) is None
+
+
+def test_shared_token_expired(config, cache, jwks_mock, token):
+    Auth(config, None, {}, cache=cache).decode_token(token)
+    auth = Auth(config, None, {}, cache=cache)
+    auth.get_public_keys()
+    with mock.patch("time.time", return_value=time.time() + 61):
+        assert auth._cached_claims(token) is None
+
+
+def test_shared_token_cache_disabled(config, cache, jwks_mock, token):
+    config = replace(config, shared_token_cache=False)
+    Auth(config, None, {}, cache=cache).decode_token(token)
+    assert Auth(config, None, {}, cache=cache)._cached_claims(token) is None
+
+
+def test_cache_errors_ignored(config, jwks_mock, token):
+    cache = mock.MagicMock()
+    cache.get.side_effect = ConnectionError()
+    cache.set.side_effect = ConnectionError()
+    auth = Auth(config, None, {}, cache=cache)
+    assert auth.decode_token(token)["username"] == "test-user"
+    assert jwks_mock.call_count == 1
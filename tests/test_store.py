@@ -0,0 +1,86 @@
+import os
+from datetime import timedelta
+
+import pytest
+from freezegun import freeze_time
+from helpers import FakeRedis
+
+from spp_cognito_auth import FileStore, MemoryStore, RedisStore, Store
+
+
+@pytest.fixture(params=["memory", "file", "redis"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryStore()
+    if request.param == "file":
+        return FileStore(str(tmp_path / "store"))
+    return RedisStore(FakeRedis())
+
+
+def test_get_set_delete(store):
+    assert store.get("my-key") is None
+    store.set("my-key", {"username": "test-user"}, 60)
+    assert store.get("my-key") == {"username": "test-user"}
+    store.delete("my-key")
+    assert store.get("my-key") is None
+
+
+def test_set_expired_ttl_deletes(store):
+    store.set("my-key", {"username": "test-user"}, 60)
+    store.set("my-key", {"username": "test-user"}, 0)
+    assert store.get("my-key") is None
+
+
+def test_store_requires_all_methods():
+    class GetOnlyStore(Store):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyStore()
+
+
+def test_memory_store_expires():
+    store = MemoryStore()
+    with freeze_time("2020-11-13") as frozen_time:
+        store.set("my-key", {"foo": "bar"}, 60)
+        frozen_time.tick(timedelta(seconds=60))
+        assert store.get("my-key") is None
+    assert len(store) == 0
+
+
+def test_memory_store_evicts_least_recently_used():
+    store = MemoryStore(maxsize=2)
+    store.set("key-1", {"value": 1}, 60)
+    store.set("key-2", {"value": 2}, 60)
+    store.get("key-1")
+    store.set("key-3", {"value": 3}, 60)
+    assert store.get("key-1") == {"value": 1}
+    assert store.get("key-2") is None
+
+
+def test_file_store_expires(tmp_path):
+    store = FileStore(str(tmp_path))
+    with freeze_time("2020-11-13") as frozen_time:
+        store.set("my-key", {"foo": "bar"}, 60)
+        frozen_time.tick(timedelta(seconds=60))
+        assert store.get("my-key") is None
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_file_store_purge(tmp_path):
+    store = FileStore(str(tmp_path))
+    with freeze_time("2020-11-13") as frozen_time:
+        store.set("old-key", {"foo": "bar"}, 60)
+        store.set("new-key", {"foo": "bar"}, 600)
+        frozen_time.tick(timedelta(seconds=60))
+        store.purge()
+    assert len(os.listdir(str(tmp_path))) == 1
+    assert "new-key" not in os.listdir(str(tmp_path))
+
+
+def test_redis_store_uses_ttl_and_prefix():
+    client = FakeRedis()
+    store = RedisStore(client)
+    store.set("my-key", {"foo": "bar"}, 59.5)
+    assert client.expiry == {"spp-cognito-auth:my-key": 60}
@@ -0,0 +1,127 @@
+import time
+
+import pytest
+import requests
+from flask import Flask, session
+
+from spp_cognito_auth import (
+    Auth,
+    AuthBlueprint,
+    new_oauth_client,
+    requires_auth,
+    requires_role,
+)
+from spp_cognito_auth.testing import FakeCognito
+
+CALLBACK_URL = "http://localhost/auth/callback"
+
+
+@pytest.fixture(scope="module")
+def cognito():
+    with FakeCognito(groups=["survey.main.read"]) as cognito:
+        yield cognito
+
+
+@pytest.fixture
+def fake_app(cognito):
+    config = cognito.config(CALLBACK_URL)
+    app = Flask(__name__)
+    app.secret_key = "my-secret-key"
+    app.auth = Auth(config, new_oauth_client(config), session)
+    app.register_blueprint(AuthBlueprint().blueprint())
+
+    @app.route("/")
+    @requires_auth
+    @requires_role(["survey.main.read"])
+    def root():
+        return "Hello, World!"
+
+    return app
+
+
+def test_login_flow(fake_app, cognito):
+    client = fake_app.test_client()
+    response = client.get("/")
+    assert response.status_code == 302
+    login = requests.get(response.headers["Location"], allow_redirects=False)
+    assert login.status_code == 302
+    assert login.headers["Location"].startswith(CALLBACK_URL + "?code=")
+    response = client.get(login.headers["Location"].replace("http://localhost", ""))
+    assert response.status_code == 302
+    assert client.get("/").data == b"Hello, World!"
+    assert cognito.requests["/oauth2/token"] >= 1
+
+
+def test_jwks(cognito):
+    response = requests.get(cognito.url + "/.well-known/jwks.json")
+    assert response.headers["Cache-Control"] == "public, max-age=3600"
+    assert [key["kid"] for key in response.json()["keys"]] == [
+        key["kid"] for key in cognito.jwks()["keys"]
+    ]
+
+
+def test_rotate_keys(cognito, fake_app):
+    old_token = cognito.sign_token()
+    kid = cognito.rotate_keys()
+    new_token = cognito.sign_token()
+    assert [key["kid"] for key in cognito.jwks()["keys"]][0] == kid
+    assert fake_app.auth.decode_token(old_token)["username"] == "test-user"
+    assert fake_app.auth.decode_token(new_token)["username"] == "test-user"
+
+
+def test_token_grants(cognito):
+    auth = (cognito.client_id, cognito.client_secret)
+    token = requests.post(
+        cognito.url + "/oauth2/token",
+        data={"grant_type": "authorization_code", "code": cognito.issue_code()},
+        auth=auth,
+    ).json()
+    assert token["expires_in"] == 3600
+    refreshed = requests.post(
+        cognito.url + "/oauth2/token",
+        data={"grant_type": "refresh_token", "refresh_token": token["refresh_token"]},
+        auth=auth,
+    )
+    assert refreshed.status_code == 200
+    assert "refresh_token" not in refreshed.json()
+    reused = requests.post(
+        cognito.url + "/oauth2/token",
+        data={"grant_type": "authorization_code", "code": "unknown-code"},
+        auth=auth,
+    )
+    assert reused.json() == {"error": "invalid_grant"}
+    unauthenticated = requests.post(
+        cognito.url + "/oauth2/token",
+        data={"grant_type": "refresh_token", "refresh_token": token["refresh_token"]},
+        auth=(cognito.client_id, "wrong-secret"),
+    )
+    assert unauthenticated.status_code == 401
+
+
+def test_inject_error(cognito):
+    cognito.inject_error("/.well-known/jwks.json", status=503, count=2)
+    statuses = [
+        requests.get(cognito.url + "/.well-known/jwks.json").status_code
+        for _ in range(3)
+    ]
+    assert statuses == [503, 503, 200]
+
+
+def test_latency(cognito):
+    cognito.latency = 0.05
+    try:
+        start = time.perf_counter()
+        requests.get(cognito.url + "/.well-known/jwks.json")
+        assert time.perf_counter() - start >= 0.05
+    finally:
+        cognito.latency = 0.0
+
+
+def test_logout_redirects_to_login(cognito):
+    response = requests.get(
+        cognito.url + "/logout?redirect_uri=http%3A%2F%2Fapp&state=s",
+        allow_redirects=False,
+    )
+    assert response.headers["Location"] == (
+        cognito.url + "/login?redirect_uri=http%3A%2F%2Fapp&state=s"
+    )
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from requests.adapters import HTTPAdapter
+
+from spp_cognito_auth import new_oauth_client, transport
+from spp_cognito_auth.transport import PooledHTTPAdapter, http_adapter, new_http_session
+
+
+def test_http_adapter(config):
+    adapter = http_adapter(config)
+    assert isinstance(adapter, PooledHTTPAdapter)
+    assert adapter.timeout == (3.05, 10)
+    assert adapter._pool_maxsize == 10
+    assert adapter.max_retries.total == 3
+    assert adapter.max_retries.backoff_factor == 0.3
+    assert http_adapter(config) is adapter
+
+
+def test_http_adapter_configured(config):
+    config.http_pool_size = 20
+    config.http_read_timeout = 5
+    adapter = http_adapter(config)
+    assert adapter._pool_maxsize == 20
+    assert adapter.timeout == (3.05, 5)
+
+
+def test_new_http_session_shares_adapter(config):
+    http = new_http_session(config)
+    oauth = new_oauth_client(config)
+    assert http.get_adapter("https://example.com") is http_adapter(config)
+    assert oauth.get_adapter("https://example.com") is http_adapter(config)
+
+
+@mock.patch.object(HTTPAdapter, "send")
+def test_adapter_default_timeout(mock_send, config):
+    adapter = http_adapter(config)
+    adapter.send("request")
+    mock_send.assert_called_once_with("request", timeout=(3.05, 10))
+    adapter.send("request", timeout=1)
+    mock_send.assert_called_with("request", timeout=1)
+
+
+def test_adapter_stats(config):
+    adapter = PooledHTTPAdapter(timeout=(1, 1))
+    assert adapter.stats() == {"connections": 0, "requests": 0}
+    pool = adapter.poolmanager.connection_from_url("https://example.com")
+    pool.num_connections = 1
+    pool.num_requests = 5
+    assert adapter.stats() == {"connections": 1, "requests": 5}
+
+
+def test_adapter_pools_dropped_after_fork(config):
+    adapter = http_adapter(config)
+    adapter.poolmanager.connection_from_url("https://example.com")
+    assert len(adapter.poolmanager.pools) > 0
+    transport._reset_adapters_after_fork()
+    assert len(adapter.poolmanager.pools) == 0
+    assert http_adapter(config) is adapter